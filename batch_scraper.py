@@ -5,6 +5,67 @@ import datetime
 import os
 import sys
 import locale
+import threading
+import atexit
+import logging
+import queue
+import argparse
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import job_scraper_improved
+from job_scraper_improved import TokenBucket
+
+try:
+    import ijson
+except ImportError:  # 可选依赖，未安装时整体读取JSON文件
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖，仅异步爬取模式需要
+    aiohttp = None
+
+try:
+    import uvloop
+except ImportError:  # 可选依赖，未安装时使用asyncio默认事件循环
+    uvloop = None
+
+@dataclass(slots=True)
+class Company:
+    """
+    批量爬取所需的公司信息
+    """
+    slug: str
+    name: str = ''
+    description: str = ''
+
+
+class _SecondCachedFormatter(logging.Formatter):
+    """
+    日志格式化器：同一秒内的日志复用已格式化的时间字符串
+    """
+    
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._cached_second = None
+        self._cached_time = ""
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = time.strftime(datefmt or self.datefmt, self.converter(second))
+            self._cached_second = second
+        return self._cached_time
+
 
 class BatchJobScraper:
     """
@@ -12,156 +73,518 @@ class BatchJobScraper:
     读取all_hiring_companies.json中的公司信息，批量爬取职位数据
     """
     
-    def __init__(self):
-        today = datetime.datetime.now().strftime("%Y%m%d")
-        json_filename = f"all_hiring_companies_{today}.json"
+    def __init__(self, isolated=False, scrape_timeout=300, failure_cache_ttl=24 * 3600, log_handlers=()):
+        """
+        Args:
+            isolated: 为True时每家公司在独立的子进程中爬取（隔离崩溃，但每次都要启动解释器）
+            scrape_timeout: 单个公司的爬取超时时间（秒）
+            failure_cache_ttl: 失败记录的有效期（秒），有效期内再次运行会跳过这些公司，0表示不跳过
+            log_handlers: 额外接收批量爬取日志的处理器（例如调用方的日志文件）
+        """
+        self.isolated = isolated
+        self.scrape_timeout = scrape_timeout
+        self.failure_cache_ttl = failure_cache_ttl
+        started_at = datetime.datetime.now()
+        self._today = started_at.strftime("%Y%m%d")
+        json_filename = f"all_hiring_companies_{self._today}.json"
         # 从result文件夹读取公司数据文件
         self.companies_file = os.path.join("result", json_filename)
+        # fetch_yc_companies同时保存的精简文件，只含slug/name/description
+        self.slim_companies_file = os.path.join("result", f"all_hiring_companies_{self._today}_slim.json")
+        self._companies = None
+        # run_batch_scraping(collect_jobs=True)时收集进程内爬取到的所有职位
+        self.collected_jobs = None
         # 使用绝对路径确保能找到脚本文件
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.scraper_script = os.path.join(current_dir, "job_scraper_improved.py")
         
+        # 子进程模式下每家公司都相同的命令前缀和参数，只在这里计算一次
+        self._system_encoding = locale.getpreferredencoding()
+        self._cmd_prefix = [sys.executable, self.scraper_script]
+        self._subprocess_kwargs = dict(
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding=self._system_encoding,
+            errors='replace',  # 替换无法解码的字符
+            bufsize=1  # 行缓冲，逐行读取输出
+        )
+        
         # 创建logs文件夹（如果不存在）
         self.logs_dir = os.path.join(current_dir, "logs")
-        if not os.path.exists(self.logs_dir):
-            os.makedirs(self.logs_dir)
+        os.makedirs(self.logs_dir, exist_ok=True)
             
         # 日志文件路径设置到logs文件夹下
-        self.log_file = os.path.join(self.logs_dir, f"batch_scraper_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+        self.log_file = os.path.join(self.logs_dir, f"batch_scraper_log_{started_at.strftime('%Y%m%d_%H%M%S')}.log")
         self.base_url = "https://www.ycombinator.com/companies/"
         
+        # 进程内爬取时所有公司共享一个HTTP会话，复用到同一主机的连接
+        self.session = None if isolated else job_scraper_improved.create_session()
+        # 所有公司共用的职位详情页令牌桶（run_batch_scraping可以传入调用方的桶）；
+        # 子进程模式下各子进程按并发数平分总速率，通过--detail-rate参数传给子进程
+        self.detail_bucket = job_scraper_improved.DETAIL_BUCKET
+        self._detail_rate_args = []
+        
+        # 失败公司缓存：记录爬取失败的slug，重跑时跳过近期已确认失败的公司
+        self.failure_cache_path = os.path.join(self.logs_dir, "failed_slugs.json")
+        self._failure_cache_lock = threading.Lock()
+        self.failure_cache = self._load_failure_cache()
+        
+        # 工作线程只把日志记录放入队列，由后台监听线程统一写文件和控制台
+        self.logger = logging.getLogger("batch_scraper")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        
+        log_queue = queue.Queue(-1)
+        self.logger.addHandler(QueueHandler(log_queue))
+        
+        # 进程内模式下，爬虫模块的警告和错误也写入批量日志（逐条进度不再刷屏）
+        if not isolated:
+            scraper_logger = logging.getLogger(job_scraper_improved.__name__)
+            scraper_logger.setLevel(logging.WARNING)
+            scraper_logger.propagate = False
+            for handler in list(scraper_logger.handlers):
+                scraper_logger.removeHandler(handler)
+            scraper_logger.addHandler(QueueHandler(log_queue))
+        
+        formatter = _SecondCachedFormatter('[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+        file_handler = logging.FileHandler(self.log_file, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+        
+        self._log_listener = QueueListener(log_queue, file_handler, stream_handler, *log_handlers)
+        self._log_listener.start()
+        atexit.register(self._log_listener.stop)
+        
     def log_message(self, message):
         """
         记录日志信息到文件和控制台
         """
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {message}"
+        self.logger.info(message)
+    
+    def _iter_company_records(self, f):
+        """
+        逐条产出公司数据文件中的记录
+        文件可以是公司列表，也可以是包含公司列表的字典（取第一个列表类型的值）
+        安装了ijson时流式解析，内存占用与单条记录大小相关而非整个文件
+        """
+        if ijson is None:
+            companies_data = orjson.loads(f.read()) if orjson is not None else json.load(f)
+            if isinstance(companies_data, list):
+                return iter(companies_data)
+            if isinstance(companies_data, dict):
+                # 如果是字典格式，尝试从不同的键中提取
+                for value in companies_data.values():
+                    if isinstance(value, list):
+                        return iter(value)
+            return iter(())
         
-        # 输出到控制台
-        print(log_entry)
+        # 探测顶层结构后回到文件开头
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
         
-        # 写入日志文件
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry + '\n')
+        if head == b'[':
+            return ijson.items(f, 'item')
+        if head == b'{':
+            # 找到第一个值为列表的顶层键，再从头流式读取该列表
+            list_key = None
+            for prefix, event, _ in ijson.parse(f):
+                if event == 'start_array' and prefix and '.' not in prefix:
+                    list_key = prefix
+                    break
+            if list_key is not None:
+                f.seek(0)
+                return ijson.items(f, f'{list_key}.item')
+        return iter(())
     
     def load_companies(self):
         """
         从all_hiring_companies.json文件中加载公司信息
+        优先读取精简文件；当日数据文件都不存在时直接从YC API获取
+        加载成功后缓存在实例上，同一进程内不再重复读取
         """
+        if self._companies is not None:
+            return self._companies
         try:
-            if not os.path.exists(self.companies_file):
-                self.log_message(f"错误: 找不到公司数据文件 {self.companies_file}")
-                return []
-            
-            with open(self.companies_file, 'r', encoding='utf-8') as f:
-                companies_data = json.load(f)
-            
-            # 提取公司slug信息
-            companies = []
-            if isinstance(companies_data, list):
-                for company in companies_data:
-                    if isinstance(company, dict) and 'slug' in company:
-                        companies.append({
-                            'slug': company['slug'],
-                            'name': company.get('name', company['slug']),
-                            'description': company.get('description', '')
-                        })
-            elif isinstance(companies_data, dict):
-                # 如果是字典格式，尝试从不同的键中提取
-                for key, value in companies_data.items():
-                    if isinstance(value, list):
-                        for company in value:
-                            if isinstance(company, dict) and 'slug' in company:
-                                companies.append({
-                                    'slug': company['slug'],
-                                    'name': company.get('name', company['slug']),
-                                    'description': company.get('description', '')
-                                })
-                        break
+            for companies_file in (self.slim_companies_file, self.companies_file):
+                try:
+                    f = open(companies_file, 'rb')
+                except FileNotFoundError:
+                    continue
+                
+                # 提取公司slug信息
+                with f:
+                    companies = [
+                        Company(c['slug'], c.get('name', c['slug']), c.get('description', ''))
+                        for c in self._iter_company_records(f)
+                        if isinstance(c, dict) and 'slug' in c
+                    ]
+                break
+            else:
+                return self._fetch_companies()
             
             self.log_message(f"成功加载 {len(companies)} 家公司信息")
+            self._companies = companies
             return companies
             
         except Exception as e:
             self.log_message(f"加载公司数据时出错: {str(e)}")
             return []
     
+    def _fetch_companies(self):
+        """
+        当日公司数据文件不存在时，调用fetch_yc_companies获取数据（同时保存到result文件夹），
+        直接使用返回的精简列表，不再从磁盘读取
+        """
+        self.log_message(f"未找到公司数据文件 {self.companies_file}，从YC API获取最新数据...")
+        # 按需导入：fetch_yc_companies导入时会创建自己的日志文件
+        from fetch_yc_companies import fetch_and_get_slim
+        
+        slim_data = fetch_and_get_slim()
+        if slim_data is None:
+            self.log_message("错误: 获取公司数据失败")
+            return []
+        
+        companies = [Company(c['slug'], c['name'], c['description']) for c in slim_data]
+        self.log_message(f"成功加载 {len(companies)} 家公司信息")
+        self._companies = companies
+        return companies
+    
+    def _load_failure_cache(self):
+        """
+        读取失败公司缓存文件，返回 {slug: {slug, timestamp, reason}}
+        """
+        try:
+            with open(self.failure_cache_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        
+        if not isinstance(entries, list):
+            return {}
+        return {entry['slug']: entry for entry in entries if isinstance(entry, dict) and 'slug' in entry}
+    
+    def _save_failure_cache(self):
+        """
+        先写临时文件再替换，避免中断时损坏缓存文件（调用方需持有锁）
+        """
+        tmp_path = self.failure_cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.failure_cache.values()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.failure_cache_path)
+    
+    def _is_cached_failure(self, company_slug):
+        """
+        判断公司是否在有效期内爬取失败过
+        """
+        if not self.failure_cache_ttl:
+            return False
+        entry = self.failure_cache.get(company_slug)
+        if not entry:
+            return False
+        try:
+            failed_at = datetime.datetime.fromisoformat(entry['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return (datetime.datetime.now() - failed_at).total_seconds() < self.failure_cache_ttl
+    
+    def _record_failure(self, company_slug, reason):
+        """
+        记录失败的公司并立即写回缓存文件
+        """
+        with self._failure_cache_lock:
+            self.failure_cache[company_slug] = {
+                'slug': company_slug,
+                'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                'reason': reason
+            }
+            self._save_failure_cache()
+    
+    def _clear_failure(self, company_slug):
+        """
+        公司重新爬取成功后移除其失败记录
+        """
+        with self._failure_cache_lock:
+            if self.failure_cache.pop(company_slug, None) is not None:
+                self._save_failure_cache()
+    
     def scrape_company_jobs(self, company_slug):
         """
         爬取单个公司的职位信息
+        默认在进程内直接调用job_scraper_improved.scrape，isolated模式下使用子进程
         """
         company_url = f"{self.base_url}{company_slug}"
         
+        if self._skip_cached_failure(company_slug):
+            return False
+        
+        if self.isolated:
+            success, failure_reason = self._scrape_company_isolated(company_slug, company_url)
+        else:
+            success, failure_reason = self._scrape_company_inprocess(company_slug, company_url)
+        
+        return self._record_outcome(company_slug, success, failure_reason)
+    
+    def _skip_cached_failure(self, company_slug):
+        """
+        公司在失败缓存有效期内时记录跳过日志并返回True
+        """
+        if not self._is_cached_failure(company_slug):
+            return False
+        reason = self.failure_cache[company_slug].get('reason', '')
+        self.log_message(f"[CACHED-SKIP] 公司 {company_slug} 近期爬取失败 ({reason})，跳过")
+        return True
+    
+    def _record_outcome(self, company_slug, success, failure_reason):
+        """
+        根据爬取结果更新失败缓存，返回是否成功
+        """
+        if failure_reason:
+            self._record_failure(company_slug, failure_reason)
+        elif company_slug in self.failure_cache:
+            self._clear_failure(company_slug)
+        return success
+    
+    def _scrape_company_inprocess(self, company_slug, company_url):
+        """
+        在当前进程内爬取单个公司的职位信息
+        返回 (是否成功, 失败原因)，没有找到职位时也会记录失败原因以便下次跳过
+        """
+        # 直接在当前工作线程中爬取；超过截止时间后scrape在请求之间停止并且不保存结果
+        # 需要强制终止时使用isolated模式
+        try:
+            self.log_message(f"开始爬取公司: {company_slug}")
+            
+            jobs = job_scraper_improved.scrape(company_url, append=True, session=self.session,
+                                               detail_bucket=self.detail_bucket,
+                                               deadline=time.monotonic() + self.scrape_timeout)
+            
+            self.log_message(f"[SUCCESS] 成功爬取公司 {company_slug}")
+            if jobs:
+                self.log_message(f"   关键信息: 找到 {len(jobs)} 个职位")
+                self._collect_jobs(jobs)
+                return True, None
+            return True, "未找到职位"
+            
+        except job_scraper_improved.ScrapeTimeout:
+            self.log_message(f"[TIMEOUT] 爬取公司 {company_slug} 超时")
+            return False, "超时"
+        except Exception as e:
+            self.log_message(f"[ERROR] 爬取公司 {company_slug} 时出现异常: {str(e)}")
+            return False, f"异常: {str(e)[:150]}"
+    
+    def _scrape_company_isolated(self, company_slug, company_url):
+        """
+        在独立的子进程中爬取单个公司的职位信息
+        返回 (是否成功, 失败原因)
+        """
         try:
             self.log_message(f"开始爬取公司: {company_slug}")
             
             # 执行爬虫脚本 - 不保存单个公司的详细日志
-            system_encoding = locale.getpreferredencoding()
+            proc = subprocess.Popen(self._cmd_prefix + [company_url, "--append"] + self._detail_rate_args, **self._subprocess_kwargs)
+            
+            # 超时后直接结束子进程，输出管道随之关闭，下面的逐行读取也会结束
+            timed_out = threading.Event()
+            def kill_on_timeout():
+                timed_out.set()
+                proc.kill()
+            killer = threading.Timer(self.scrape_timeout, kill_on_timeout)
+            killer.daemon = True
+            killer.start()
             
-            result = subprocess.run(
-                [sys.executable, self.scraper_script, company_url, "--append"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding=system_encoding,
-                errors='replace',  # 替换无法解码的字符
-                timeout=300  # 5分钟超时
+            # 逐行读取输出，只保留最后2行关键信息和错误信息，不缓存完整输出
+            # stderr在单独的线程中读取，避免任一管道写满导致子进程阻塞
+            error_lines = deque(maxlen=2)
+            stderr_reader = threading.Thread(
+                target=self._collect_error_lines, args=(proc.stderr, error_lines), daemon=True
             )
+            stderr_reader.start()
+            
+            key_lines = deque(maxlen=2)
+            no_jobs = False
+            try:
+                for line in proc.stdout:
+                    if '找到' in line or '保存' in line or '完成' in line:
+                        key_lines.append(line.strip())
+                    if '未找到任何职位信息' in line:
+                        no_jobs = True
+                returncode = proc.wait()
+            finally:
+                killer.cancel()
+                stderr_reader.join()
+                proc.stdout.close()
+                proc.stderr.close()
+            
+            if timed_out.is_set():
+                self.log_message(f"[TIMEOUT] 爬取公司 {company_slug} 超时")
+                return False, "超时"
             
             # 记录执行结果
-            # 记录执行结果
-            if result.returncode == 0:
+            if returncode == 0:
                 self.log_message(f"[SUCCESS] 成功爬取公司 {company_slug}")
                 # 只记录关键的输出信息
-                if result.stdout:
-                    output_lines = result.stdout.strip().split('\n')
-                    key_lines = [line for line in output_lines if '找到' in line or '保存' in line or '完成' in line]
-                    if key_lines:
-                        self.log_message(f"   关键信息: {'; '.join(key_lines[-2:])}")  # 只记录最后2行关键信息
-                return True
+                if key_lines:
+                    self.log_message(f"   关键信息: {'; '.join(key_lines)}")
+                if no_jobs:
+                    return True, "未找到职位"
+                return True, None
             else:
-                self.log_message(f"[FAILED] 爬取公司 {company_slug} 失败，返回码: {result.returncode}")
+                self.log_message(f"[FAILED] 爬取公司 {company_slug} 失败，返回码: {returncode}")
                 # 只记录简要的错误信息
-                if result.stderr:
-                    error_lines = [line for line in result.stderr.strip().split('\n') if 'error' in line.lower() or '错误' in line or 'exception' in line.lower()]
-                    if error_lines:
-                        error_msg = '; '.join(error_lines[:2])[:150]  # 限制错误信息长度
-                        self.log_message(f"   错误信息: {error_msg}")
-                return False
+                if error_lines:
+                    error_msg = '; '.join(error_lines)[:150]  # 限制错误信息长度
+                    self.log_message(f"   错误信息: {error_msg}")
+                return False, f"返回码 {returncode}"
                 
-        except subprocess.TimeoutExpired:
-            self.log_message(f"[TIMEOUT] 爬取公司 {company_slug} 超时")
-            return False
         except Exception as e:
             self.log_message(f"[ERROR] 爬取公司 {company_slug} 时出现异常: {str(e)}")
-            return False
+            return False, f"异常: {str(e)[:150]}"
+    
+    def _collect_jobs(self, jobs):
+        """
+        收集进程内爬取到的职位（list.extend在多线程下是原子操作）
+        """
+        if self.collected_jobs is not None:
+            self.collected_jobs.extend(jobs)
+    
+    @staticmethod
+    def _collect_error_lines(stream, error_lines):
+        """
+        读取子进程的stderr，把包含错误关键字的行放入error_lines
+        """
+        for line in stream:
+            lowered = line.lower()
+            if 'error' in lowered or '错误' in line or 'exception' in lowered:
+                error_lines.append(line.strip())
+    
+    def _scrape_with_rate_limit(self, company_slug):
+        """
+        工作线程入口：先从令牌桶取得令牌，再爬取单个公司（缓存中跳过的公司不消耗令牌）
+        """
+        if not self._is_cached_failure(company_slug):
+            self.bucket.acquire()
+        return self.scrape_company_jobs(company_slug)
+    
+    def _run_with_thread_pool(self, targets, max_workers, on_result):
+        """
+        使用线程池并发爬取，按完成顺序回调on_result(company, success)
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._scrape_with_rate_limit, company.slug): company
+                for company in targets
+            }
+            
+            for future in as_completed(futures):
+                company = futures[future]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    self.log_message(f"[ERROR] 爬取公司 {company.slug} 时出现异常: {str(e)}")
+                    success = False
+                on_result(company, success)
+    
+    async def _scrape_company_async(self, session, company, semaphore):
+        """
+        异步爬取单个公司，返回 (company, 是否成功)
+        """
+        company_slug = company.slug
+        if self._skip_cached_failure(company_slug):
+            return company, False
+        
+        company_url = f"{self.base_url}{company_slug}"
+        async with semaphore:
+            await self.bucket.acquire_async()
+            self.log_message(f"开始爬取公司: {company_slug}")
+            try:
+                jobs = await asyncio.wait_for(
+                    job_scraper_improved.scrape_async(company_url, session, append=True, detail_bucket=self.detail_bucket),
+                    timeout=self.scrape_timeout
+                )
+            except asyncio.TimeoutError:
+                self.log_message(f"[TIMEOUT] 爬取公司 {company_slug} 超时")
+                success, failure_reason = False, "超时"
+            except Exception as e:
+                self.log_message(f"[ERROR] 爬取公司 {company_slug} 时出现异常: {str(e)}")
+                success, failure_reason = False, f"异常: {str(e)[:150]}"
+            else:
+                self.log_message(f"[SUCCESS] 成功爬取公司 {company_slug}")
+                if jobs:
+                    self.log_message(f"   关键信息: 找到 {len(jobs)} 个职位")
+                    self._collect_jobs(jobs)
+                success, failure_reason = True, None if jobs else "未找到职位"
+        
+        return company, self._record_outcome(company_slug, success, failure_reason)
+    
+    async def _scrape_all_async(self, targets, max_concurrency, on_result):
+        """
+        在单个事件循环中并发爬取所有公司，并发数由信号量限制
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        connector = aiohttp.TCPConnector(limit=50, limit_per_host=8)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [self._scrape_company_async(session, company, semaphore) for company in targets]
+            for next_done in asyncio.as_completed(tasks):
+                company, success = await next_done
+                on_result(company, success)
+    
+    def _run_with_asyncio(self, targets, max_concurrency, on_result):
+        """
+        使用aiohttp异步爬取，安装了uvloop时使用uvloop事件循环
+        """
+        coroutine = self._scrape_all_async(targets, max_concurrency, on_result)
+        if uvloop is not None:
+            uvloop.run(coroutine)
+        else:
+            asyncio.run(coroutine)
     
-    def run_batch_scraping(self, start_index=0, max_companies=None, delay_seconds=3):
+    def run_batch_scraping(self, companies=None, start_index=0, max_companies=None, delay_seconds=3, max_workers=4, use_async=False,
+                           collect_jobs=False, detail_bucket=None):
         """
         执行批量爬取
+        collect_jobs为True时返回爬取到的所有职位列表（isolated模式下职位只写入文件，返回空列表）
         
         Args:
+            companies: 已加载的公司列表（None表示调用load_companies加载）
             start_index: 开始索引（用于断点续传）
             max_companies: 最大爬取公司数量（None表示全部）
-            delay_seconds: 每次爬取之间的延迟时间（秒）
+            delay_seconds: 平均每隔多少秒启动一次爬取（令牌桶速率为1/delay_seconds）
+            max_workers: 并发爬取的公司数量
+            use_async: 为True时使用aiohttp在单线程事件循环中并发爬取
+            collect_jobs: 是否在内存中收集职位，供调用方直接合并而不必再读取CSV文件
+            detail_bucket: 所有公司共用的职位详情页令牌桶（None表示使用job_scraper_improved.DETAIL_BUCKET），
+                           并发爬取多家公司时限制的是整体的详情页请求速率
         """
+        self.collected_jobs = [] if collect_jobs else None
         self.log_message("=" * 60)
         self.log_message("开始批量爬取YCombinator公司职位信息")
         self.log_message("=" * 60)
         
         # 加载公司数据
-        companies = self.load_companies()
+        if companies is None:
+            companies = self.load_companies()
         if not companies:
             self.log_message("没有找到公司数据，退出程序")
-            return
+            return self.collected_jobs
         
         # 确定爬取范围
         total_companies = len(companies)
         end_index = min(start_index + max_companies, total_companies) if max_companies else total_companies
         
+        if use_async and (aiohttp is None or self.isolated):
+            self.log_message("异步模式需要安装aiohttp且不能与isolated模式同时使用，改用线程池")
+            use_async = False
+        
         self.log_message(f"总公司数量: {total_companies}")
         self.log_message(f"爬取范围: {start_index} - {end_index-1}")
         self.log_message(f"每次爬取间隔: {delay_seconds} 秒")
+        self.log_message(f"并发数: {max_workers} ({'asyncio' if use_async else '线程池'})")
         
         # 如果max_companies超过了总公司数量，给出提示
         if max_companies and max_companies > total_companies:
@@ -171,30 +594,32 @@ class BatchJobScraper:
         # 统计信息
         success_count = 0
         failed_count = 0
+        completed = 0
+        total_to_scrape = end_index - start_index
         
-        # 开始批量爬取
-        for i in range(start_index, end_index):
-            company = companies[i]
-            company_slug = company['slug']
-            company_name = company['name']
-            
-            self.log_message(f"\n进度: {i+1}/{end_index} - 处理公司: {company_name} ({company_slug})")
-            
-            # 爬取公司职位
-            success = self.scrape_company_jobs(company_slug)
-            
+        def on_result(company, success):
+            nonlocal success_count, failed_count, completed
+            completed += 1
             if success:
                 success_count += 1
             else:
                 failed_count += 1
             
+            self.log_message(f"\n进度: {completed}/{total_to_scrape} - 完成公司: {company.name} ({company.slug})")
+            
             # 记录当前统计
             self.log_message(f"当前统计 - 成功: {success_count}, 失败: {failed_count}")
-            
-            # 延迟，避免请求过于频繁
-            if i < end_index - 1:  # 最后一个不需要延迟
-                self.log_message(f"等待 {delay_seconds} 秒后继续...")
-                time.sleep(delay_seconds)
+        
+        # 开始批量爬取：各公司相互独立，并发执行并按完成顺序处理结果
+        targets = companies[start_index:end_index]
+        self.bucket = TokenBucket(1 / delay_seconds if delay_seconds > 0 else float('inf'))
+        if detail_bucket is not None:
+            self.detail_bucket = detail_bucket
+        self._detail_rate_args = [f"--detail-rate={job_scraper_improved.DETAIL_RATE / max(max_workers, 1)}"]
+        if use_async:
+            self._run_with_asyncio(targets, max_workers, on_result)
+        else:
+            self._run_with_thread_pool(targets, max_workers, on_result)
         
         # 输出最终统计
         self.log_message("\n" + "=" * 60)
@@ -206,6 +631,7 @@ class BatchJobScraper:
         self.log_message(f"主日志文件: {self.log_file}")
         self.log_message(f"所有日志保存在: {self.logs_dir}")
         self.log_message("=" * 60)
+        return self.collected_jobs
     
     def show_companies_preview(self, limit=10):
         """
@@ -219,7 +645,7 @@ class BatchJobScraper:
         self.log_message("-" * 50)
         
         for i, company in enumerate(companies[:limit]):
-            self.log_message(f"{i+1:3d}. {company['name']} ({company['slug']})")
+            self.log_message(f"{i+1:3d}. {company.name} ({company.slug})")
         
         if len(companies) > limit:
             self.log_message(f"... 还有 {len(companies) - limit} 家公司")
@@ -227,70 +653,98 @@ class BatchJobScraper:
         self.log_message(f"\n总计: {len(companies)} 家公司")
 
 
+def _add_common_flags(parser, default):
+    """
+    添加附加参数；子命令使用SUPPRESS作为默认值，避免覆盖写在子命令之前的参数
+    """
+    parser.add_argument("--isolated", action="store_true", default=default,
+                        help="每家公司在独立子进程中爬取")
+    parser.add_argument("--retry-failed", action="store_true", default=default,
+                        help="重新爬取24小时内失败过的公司")
+    parser.add_argument("--async", dest="use_async", action="store_true", default=default,
+                        help="使用aiohttp异步并发爬取（需安装aiohttp）")
+
+
+def build_arg_parser():
+    """
+    构建命令行参数解析器，附加参数既可以写在子命令之前，也可以写在子命令之后
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    _add_common_flags(common, argparse.SUPPRESS)
+    
+    parser = argparse.ArgumentParser(
+        prog="batch_scraper.py",
+        description="批量YCombinator职位爬虫",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""示例:
+  python batch_scraper.py preview 20              - 预览前20家公司
+  python batch_scraper.py run 0 10 5              - 从第0家开始爬取10家公司，每次间隔5秒
+  python batch_scraper.py run 10                  - 从第10家开始爬取所有剩余公司
+  python batch_scraper.py run 0 100 1 8           - 从第0家开始爬取100家公司，间隔1秒，8个线程并发"""
+    )
+    _add_common_flags(parser, False)
+    parser.set_defaults(limit=10)
+    subparsers = parser.add_subparsers(dest="command", metavar="{preview,count,run,help}")
+    
+    preview_parser = subparsers.add_parser("preview", parents=[common], help="预览公司列表")
+    preview_parser.add_argument("limit", nargs="?", type=int, default=10, help="预览数量（默认10）")
+    
+    subparsers.add_parser("count", parents=[common], help="显示可用公司总数")
+    
+    run_parser = subparsers.add_parser("run", parents=[common], help="执行批量爬取")
+    run_parser.add_argument("start_index", nargs="?", type=int, default=0, help="起始索引（默认0）")
+    run_parser.add_argument("max_companies", nargs="?", type=int, default=None, help="最大数量（默认全部）")
+    run_parser.add_argument("delay_seconds", nargs="?", type=float, default=3, help="延迟秒数（默认3）")
+    run_parser.add_argument("max_workers", nargs="?", type=int, default=4, help="并发数（默认4）")
+    
+    subparsers.add_parser("help", help="显示帮助信息")
+    return parser
+
+
 def main():
     """
     主函数
     """
-    scraper = BatchJobScraper()
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    # 不带子命令时默认显示预览
+    command = args.command or "preview"
     
-    # 检查命令行参数
-    if len(sys.argv) > 1:
-        command = sys.argv[1].lower()
+    if command == "help":
+        parser.print_help()
+        return
+    
+    scraper = BatchJobScraper(isolated=args.isolated, failure_cache_ttl=0 if args.retry_failed else 24 * 3600)
+    
+    if command == "preview":
+        # 显示公司列表预览
+        scraper.show_companies_preview(args.limit)
         
-        if command == "preview":
-            # 显示公司列表预览
-            limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-            scraper.show_companies_preview(limit)
-            
-        elif command == "run":
-            # 执行批量爬取
-            start_index = int(sys.argv[2]) if len(sys.argv) > 2 else 0
-            max_companies = int(sys.argv[3]) if len(sys.argv) > 3 else None
-            delay_seconds = int(sys.argv[4]) if len(sys.argv) > 4 else 3
-            
-            # 先加载公司数据，获取总数
-            companies = scraper.load_companies()
-            total_companies = len(companies) if companies else 0
-            
-            if total_companies > 0:
-                if max_companies is None:
-                    print(f"将爬取从索引 {start_index} 开始的所有公司 (总计 {total_companies} 家)")
-                    print(f"如果只想爬取部分公司，请指定数量，例如: python batch_scraper.py run {start_index} 10 {delay_seconds}")
-                else:
-                    actual_count = min(max_companies, total_companies - start_index)
-                    print(f"将爬取从索引 {start_index} 开始的 {actual_count} 家公司 (总计 {total_companies} 家)")
-                
-                # 询问用户是否继续
-                confirm = input("是否继续爬取? (y/n): ")
-                if confirm.lower() != 'y':
-                    print("已取消爬取")
-                    return
-            
-            scraper.run_batch_scraping(start_index, max_companies, delay_seconds)
-            
-        elif command == "count":
-            # 显示公司总数
-            companies = scraper.load_companies()
-            total_companies = len(companies) if companies else 0
-            print(f"当前可用公司总数: {total_companies}")
-            
-        elif command == "help":
-            print("批量YCombinator职位爬虫使用说明:")
-            print("python batch_scraper.py preview [数量]           - 预览公司列表")
-            print("python batch_scraper.py count                   - 显示可用公司总数")
-            print("python batch_scraper.py run [起始索引] [最大数量] [延迟秒数] - 执行批量爬取")
-            print("python batch_scraper.py help                    - 显示帮助信息")
-            print("\n示例:")
-            print("python batch_scraper.py preview 20              - 预览前20家公司")
-            print("python batch_scraper.py run 0 10 5              - 从第0家开始爬取10家公司，每次间隔5秒")
-            print("python batch_scraper.py run 10                  - 从第10家开始爬取所有剩余公司")
+    elif command == "run":
+        # 执行批量爬取：公司数据只加载一次，确认后直接传给run_batch_scraping
+        companies = scraper.load_companies()
+        total_companies = len(companies)
+        
+        if total_companies > 0:
+            if args.max_companies is None:
+                print(f"将爬取从索引 {args.start_index} 开始的所有公司 (总计 {total_companies} 家)")
+                print(f"如果只想爬取部分公司，请指定数量，例如: python batch_scraper.py run {args.start_index} 10 {args.delay_seconds:g}")
+            else:
+                actual_count = min(args.max_companies, total_companies - args.start_index)
+                print(f"将爬取从索引 {args.start_index} 开始的 {actual_count} 家公司 (总计 {total_companies} 家)")
             
-        else:
-            print(f"未知命令: {command}")
-            print("使用 'python batch_scraper.py help' 查看帮助信息")
-    else:
-        # 默认显示预览
-        scraper.show_companies_preview()
+            # 询问用户是否继续
+            confirm = input("是否继续爬取? (y/n): ")
+            if confirm.lower() != 'y':
+                print("已取消爬取")
+                return
+        
+        scraper.run_batch_scraping(companies, args.start_index, args.max_companies,
+                                   args.delay_seconds, args.max_workers, args.use_async)
+        
+    elif command == "count":
+        # 显示公司总数
+        print(f"当前可用公司总数: {len(scraper.load_companies())}")
 
 
 if __name__ == "__main__":
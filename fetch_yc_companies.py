@@ -7,13 +7,25 @@ YC公司数据获取脚本
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import csv
-import pandas as pd
 from datetime import datetime
 import logging
 import sys
 import os
+from contextlib import contextmanager
+
+try:
+    import requests_cache
+except ImportError:  # 可选依赖，未安装时不使用HTTP缓存
+    requests_cache = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
 
 # 创建logs文件夹（如果不存在）
 os.makedirs('logs', exist_ok=True)
@@ -30,21 +42,47 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def fetch_yc_companies():
+def create_session():
+    """
+    创建带连接池的HTTP会话
+    安装了requests-cache时使用SQLite磁盘缓存，遵循服务器的Cache-Control/ETag，
+    数据未变化时重复运行只需一次条件请求
+    """
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(
+            os.path.join('logs', 'yc_http_cache.sqlite'),
+            cache_control=True,
+            expire_after=3600
+        )
+    else:
+        session = requests.Session()
+    
+    # 复用连接池（keep-alive），并对限流和服务端错误自动退避重试
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_yc_companies(session=None):
     """
     从YC API获取所有公司数据
     """
     #api_url = "https://yc-oss.github.io/api/companies/all.json"
     api_url = "https://yc-oss.github.io/api/companies/hiring.json"
+    if session is None:
+        session = create_session()
     try:
         logger.info(f"开始从 {api_url} 获取数据...")
         
         # 发送GET请求
-        response = requests.get(api_url, timeout=30)
+        response = session.get(api_url, timeout=30)
         response.raise_for_status()
+        if getattr(response, 'from_cache', False):
+            logger.info("数据未变化，使用本地HTTP缓存")
         
         # 解析JSON数据
-        companies_data = response.json()
+        companies_data = orjson.loads(response.content) if orjson is not None else response.json()
         
         logger.info(f"成功获取 {len(companies_data)} 家公司的数据")
         return companies_data
@@ -66,20 +104,63 @@ def save_to_json(data, filename):
     try:
         # 确保result目录存在
         result_dir = "result"
-        if not os.path.exists(result_dir):
-            os.makedirs(result_dir)
+        os.makedirs(result_dir, exist_ok=True)
         
         # 添加result路径前缀
         filepath = os.path.join(result_dir, filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 先序列化为完整的字节串，再一次性写入临时文件并原子替换
+        if orjson is not None:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        else:
+            payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        with atomic_write(filepath, 'wb') as f:
+            f.write(payload)
         logger.info(f"成功保存JSON文件: {filepath}")
         return True
     except Exception as e:
         logger.error(f"保存JSON文件失败: {e}")
         return False
 
+@contextmanager
+def atomic_write(filepath, mode='w', **open_kwargs):
+    """
+    先写入临时文件，写完并刷新到磁盘后再原子替换目标文件
+    进程中途被终止时，目标文件保持上一次的完整内容，不会留下写了一半的文件
+    """
+    tmp_path = filepath + ".tmp"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    # 同步目录项，确保重命名本身也已落盘（Windows不支持打开目录，跳过）
+    if os.name != 'nt':
+        dir_fd = os.open(os.path.dirname(os.path.abspath(filepath)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def flatten_record(record, parent_key='', sep='.'):
+    """
+    展开嵌套字典，子字段以"父字段.子字段"命名（与pandas.json_normalize一致）
+    """
+    flat = {}
+    for key, value in record.items():
+        new_key = f"{parent_key}{sep}{key}" if parent_key else key
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, new_key, sep))
+        else:
+            flat[new_key] = value
+    return flat
+
 def save_to_csv(data, filename):
     """
     保存数据为CSV格式
@@ -91,18 +172,21 @@ def save_to_csv(data, filename):
         
         # 确保result目录存在
         result_dir = "result"
-        if not os.path.exists(result_dir):
-            os.makedirs(result_dir)
+        os.makedirs(result_dir, exist_ok=True)
         
         # 添加result路径前缀
         filepath = os.path.join(result_dir, filename)
-            
-        # 使用pandas处理数据
-        df = pd.json_normalize(data)
+        
+        # 展开嵌套字段，并按首次出现的顺序收集所有列名
+        rows = [flatten_record(row) for row in data]
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
         
         # 保存为CSV
-        df.to_csv(filepath, index=False, encoding='utf-8-sig')
-        logger.info(f"成功保存CSV文件: {filepath} (共 {len(df)} 行数据)")
+        with atomic_write(filepath, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        logger.info(f"成功保存CSV文件: {filepath} (共 {len(rows)} 行数据)")
         return True
         
     except Exception as e:
@@ -120,9 +204,47 @@ def get_file_names():
     csv_filename = f"all_hiring_companies_{today}.csv"
     return json_filename, csv_filename
 
+def get_slim_file_name(json_filename):
+    """
+    精简JSON文件名：all_hiring_companies_YYYYMMDD_slim.json
+    """
+    return json_filename[:-len(".json")] + "_slim.json"
+
+def slim_companies(companies_data):
+    """
+    只保留批量爬取职位所需的slug、name、description三个字段
+    """
+    return [
+        {
+            'slug': company['slug'],
+            'name': company.get('name', company['slug']),
+            'description': company.get('description', '')
+        }
+        for company in companies_data
+        if isinstance(company, dict) and 'slug' in company
+    ]
+
+def fetch_and_get_slim(session=None):
+    """
+    获取公司数据并保存完整的JSON/CSV和精简JSON，直接返回精简后的公司列表
+    供batch_scraper在当日数据文件不存在时调用，省去写入后再读取解析完整JSON的过程
+    获取失败时返回None
+    """
+    companies_data = fetch_yc_companies(session)
+    if companies_data is None:
+        return None
+    
+    json_filename, csv_filename = get_file_names()
+    save_to_json(companies_data, json_filename)
+    save_to_csv(companies_data, csv_filename)
+    
+    slim_data = slim_companies(companies_data)
+    save_to_json(slim_data, get_slim_file_name(json_filename))
+    return slim_data
+
 def main():
     """
-    主函数
+    主函数，返回保存的CSV文件路径
     """
     logger.info("=== YC公司数据获取脚本开始执行 ===")
     
@@ -142,6 +264,9 @@ def main():
     # 保存CSV文件
     csv_success = save_to_csv(companies_data, csv_filename)
     
+    # 保存只含slug/name/description的精简JSON，供batch_scraper快速加载
+    save_to_json(slim_companies(companies_data), get_slim_file_name(json_filename))
+    
     # 输出结果统计
     logger.info("=== 执行结果统计 ===")
     logger.info(f"获取公司数量: {len(companies_data)}")
@@ -157,6 +282,7 @@ def main():
         sys.exit(1)
     
     logger.info("=== 脚本执行完成 ===")
+    return os.path.join("result", csv_filename)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
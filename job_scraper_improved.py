@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import re
 import json
@@ -7,6 +9,339 @@ import sys
 import time
 import os
 import datetime
+import contextlib
+import threading
+import codecs
+import functools
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖，仅异步爬取时需要
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
+
+try:
+    import diskcache
+except ImportError:  # 可选依赖，未安装时不缓存职位详情
+    diskcache = None
+
+try:
+    from lxml import html as lxml_html
+    HTML_PARSER = 'lxml'
+except ImportError:  # 可选依赖，未安装时使用BeautifulSoup和较慢的纯Python解析器
+    lxml_html = None
+    HTML_PARSER = 'html.parser'
+
+# 解析用的正则表达式，模块加载时编译一次
+_JOB_TITLE_FROM_URL_RE = re.compile(r'/jobs/[^-]+-(.+)$')
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+# 从页面中查找signup_job_id，考虑URL编码的情况：
+# 标准格式 "="、URL编码格式 "%3D"（等号的编码）、双重URL编码格式 "%253D"，按此顺序优先
+_SIGNUP_JOB_ID_RE = re.compile(r'signup_job_id(=|%3D|%253D)(\d+)')
+_SIGNUP_SEPARATORS = ('=', '%3D', '%253D')
+# 查找包含所有字段的JSON结构
+_JOB_JSON_RE = re.compile(r'salaryRange&quot;:&quot;(.*?)&quot;,&quot;equityRange&quot;:&quot;(.*?)&quot;,&quot;minExperience&quot;:&quot;(.*?)&quot;,&quot;minSchoolYear&quot;:&quot;(.*?)&quot;,&quot;visa&quot;:&quot;(.*?)&quot;')
+# 格式: <div><strong>Location</strong></div><span>San Francisco, CA </span>
+#       <div><strong>Job Type</strong></div><span>Full-time</span>
+_LABELED_FIELD_RE = re.compile(r'<div><strong>(Location|Job Type)</strong></div><span>(.*?)</span>')
+_HIRING_DESCRIPTION_RE = re.compile(r'hiring_description&quot;:&quot;(.*?)&quot;')
+_JOB_DESCRIPTION_RE = re.compile(r'<meta[^>]*content="([^"]*)"[^>]*name="description"[^>]*>', re.DOTALL)
+_EXPERIENCE_YEARS_RE = re.compile(r'(\d+)')
+
+
+# 流式下载详情页时，以下内容都已出现即可停止下载（各正则都以固定的结束标记结尾，不会匹配到被截断的值）
+_DETAIL_PAGE_MARKERS = (
+    # 注册链接中的job_id可能是原样的=，也可能是URL编码后的%3D或%253D，任一形式出现都算找到
+    re.compile(r'signup_job_id(?:=|%3D|%253D)\d+\D'),
+    _JOB_JSON_RE,
+    re.compile(r'<div><strong>Location</strong></div><span>.*?</span>'),
+    re.compile(r'<div><strong>Job Type</strong></div><span>.*?</span>'),
+    _HIRING_DESCRIPTION_RE,
+    _JOB_DESCRIPTION_RE,
+)
+# 流式下载的块大小，同时也是每次检查时回看的长度，保证跨块的内容也能匹配到
+_STREAM_CHUNK_SIZE = 65536
+
+
+class _DetailPageBuffer:
+    """
+    累积流式下载的职位详情页，判断解析所需的字段是否都已出现
+    字段都在已下载的前缀中时，对前缀的解析结果与对完整页面的解析结果相同
+    """
+    
+    def __init__(self):
+        self.text = ''
+        self._missing = list(_DETAIL_PAGE_MARKERS)
+    
+    def feed(self, chunk):
+        """
+        追加一块内容，所需字段都已出现时返回True
+        """
+        start = max(0, len(self.text) - _STREAM_CHUNK_SIZE)
+        self.text += chunk
+        self._missing = [marker for marker in self._missing if not marker.search(self.text, start)]
+        return not self._missing
+
+
+def _find_signup_job_id(html):
+    """
+    一次扫描找出signup_job_id，返回 (job_id, 格式分隔符)，未找到时返回 (None, None)
+    标准格式优先，找到后立即停止；否则使用最先出现的编码格式
+    """
+    first_by_separator = {}
+    for match in _SIGNUP_JOB_ID_RE.finditer(html):
+        separator = match.group(1)
+        if separator == '=':
+            return match.group(2), separator
+        first_by_separator.setdefault(separator, match.group(2))
+    for separator in _SIGNUP_SEPARATORS:
+        if separator in first_by_separator:
+            return first_by_separator[separator], separator
+    return None, None
+
+
+def _find_labeled_fields(html):
+    """
+    一次扫描找出Location和Job Type，返回 {标签: 第一次出现的值}
+    """
+    fields = {}
+    for match in _LABELED_FIELD_RE.finditer(html):
+        fields.setdefault(match.group(1), match.group(2))
+        if len(fields) == 2:
+            break
+    return fields
+
+
+@functools.lru_cache(maxsize=256)
+def _company_job_href_re(company_slug):
+    """
+    匹配指定公司职位详情链接的正则，按公司缓存编译结果
+    """
+    return re.compile(rf'/companies/{re.escape(company_slug)}/jobs/[^/]+$', re.IGNORECASE)
+
+
+def _xpath_has_class(name):
+    """
+    XPath条件：class属性中包含指定的类名（等价于CSS的 .name）
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# 逐条的解析细节使用DEBUG级别，默认不输出；命令行运行时main()把INFO及以上级别输出到标准输出
+logger = logging.getLogger(__name__)
+
+# 进程内并发调用scrape()时，先在线程间互斥，再获取跨进程文件锁
+_SAVE_LOCK = threading.Lock()
+
+
+def _pid_alive(pid):
+    """
+    判断进程是否仍在运行
+    Windows上os.kill(pid, 0)会直接结束目标进程，无法用来探测，一律视为存活（只按修改时间判断过期）
+    """
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在，只是属于其他用户
+        return True
+    return True
+
+
+def _lock_is_stale(lock_path, timeout):
+    """
+    判断锁文件是否为残留锁：持有者进程已退出，或锁文件超过timeout秒未更新
+    锁文件内容为"pid 时间戳 随机串"，内容不完整时只按修改时间判断
+    """
+    try:
+        mtime = os.path.getmtime(lock_path)
+        with open(lock_path, 'r', encoding='ascii', errors='replace') as f:
+            owner = f.read().split()
+    except FileNotFoundError:
+        return False
+    if time.time() - mtime > timeout:
+        return True
+    if owner and owner[0].isdigit() and len(owner) == 3:
+        return not _pid_alive(int(owner[0]))
+    return False
+
+
+def _read_lock_owner(lock_path):
+    """读取锁文件中的持有者标识，文件不存在时返回None"""
+    try:
+        with open(lock_path, 'r', encoding='ascii', errors='replace') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+@contextlib.contextmanager
+def output_file_lock(result_dir="result", timeout=120):
+    """
+    跨进程的汇总文件写锁
+    批量爬取时多个爬虫进程会同时追加写入all_jobs_*.csv/jsonl，
+    通过独占创建锁文件保证同一时刻只有一个进程在写
+    锁文件中记录持有者的pid和时间，只有持有者进程已退出或锁文件超过timeout秒未更新时才接管；
+    接管时用os.replace原子替换锁文件，退出时只删除仍属于本进程的锁
+    """
+    os.makedirs(result_dir, exist_ok=True)
+    lock_path = os.path.join(result_dir, ".all_jobs.lock")
+    token = f"{os.getpid()} {time.time():.3f} {os.urandom(8).hex()}"
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not _lock_is_stale(lock_path, timeout):
+                time.sleep(0.1)
+                continue
+            logger.warning("检测到残留的文件锁（持有者已退出或超时），接管: %s", lock_path)
+            tmp_path = f"{lock_path}.{token.split()[-1]}"
+            with open(tmp_path, 'w', encoding='ascii') as f:
+                f.write(token)
+            os.replace(tmp_path, lock_path)
+            # 多个等待者可能同时判定过期并接管，稍等后确认锁文件仍是自己写入的
+            time.sleep(0.1)
+            if _read_lock_owner(lock_path) == token:
+                break
+            continue
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(token)
+        break
+    try:
+        yield
+    finally:
+        if _read_lock_owner(lock_path) == token:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+        else:
+            logger.warning("文件锁已被其他进程接管，保留锁文件: %s", lock_path)
+
+
+def _write_bytes_atomic(filepath, data):
+    """
+    先写入同目录下的临时文件，再用os.replace替换目标文件
+    写入过程中异常退出时，原文件保持完整
+    """
+    tmp_path = filepath + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# 职位详情磁盘缓存的位置和有效期（秒）
+DETAIL_CACHE_DIR = os.path.join('logs', 'job_detail_cache')
+DETAIL_CACHE_TTL = 24 * 3600
+
+# 已打开的职位详情磁盘缓存 {目录: diskcache.Cache}，同一目录在进程内只打开一次
+_DETAIL_CACHES = {}
+_DETAIL_CACHES_LOCK = threading.Lock()
+
+
+def open_detail_cache(directory):
+    """
+    返回目录对应的职位详情磁盘缓存，所有爬虫实例共用（diskcache.Cache是线程安全的），
+    批量爬取时不会每家公司各打开一个SQLite连接而不关闭
+    """
+    with _DETAIL_CACHES_LOCK:
+        cache = _DETAIL_CACHES.get(directory)
+        if cache is None:
+            cache = _DETAIL_CACHES[directory] = diskcache.Cache(directory)
+        return cache
+
+# 需要重试的服务器错误状态码
+_RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+class ScrapeTimeout(Exception):
+    """
+    爬取超过截止时间（scrape的deadline参数）时抛出，此时不会再获取详情页，也不会保存结果
+    """
+
+
+class TokenBucket:
+    """
+    令牌桶限速器：以rate_per_sec的速率补充令牌，最多积攒capacity个
+    线程池的工作线程和事件循环中的协程共用同一个桶，限制整体的请求速率；
+    请求本身已经较慢时不再额外等待
+    """
+    
+    def __init__(self, rate_per_sec, capacity=1):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self):
+        """
+        取走一个令牌并返回需要等待的秒数；令牌不足时先预支，调用方等待期间不占用锁
+        """
+        if self.rate == float('inf'):
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+    
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# 每秒最多发起的职位详情页请求数和最多同时突发的请求数，是整个进程的上限（所有公司、所有爬虫实例合计）
+DETAIL_RATE = 5
+DETAIL_CONCURRENCY = 4
+
+# 进程内所有爬虫实例默认共用的详情页令牌桶：批量并发爬取多家公司时，限制的是所有公司合计的请求速率
+DETAIL_BUCKET = TokenBucket(DETAIL_RATE, capacity=DETAIL_CONCURRENCY)
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+def create_session(pool_size=32):
+    """
+    创建带连接池的HTTP会话，同一会话的请求复用TCP/TLS连接（keep-alive）
+    批量爬取时所有公司共享一个会话
+    """
+    session = requests.Session()
+    # 不手动设置Accept-Encoding：requests默认声明gzip/deflate，安装了brotli时自动加入br并负责解压
+    session.headers.update(DEFAULT_HEADERS)
+    # 连接失败、请求超时和服务器错误(5xx)都由urllib3按指数退避自动重试
+    retry = Retry(total=3, backoff_factor=1.5, status_forcelist=_RETRY_STATUS_CODES, allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
 
 class YCombinatorJobScraper:
     """
@@ -14,81 +349,114 @@ class YCombinatorJobScraper:
     支持根据输入的公司URL爬取所有职位信息
     """
     
-    def __init__(self):
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+    # 汇总CSV文件的列
+    CSV_FIELDNAMES = ['company', 'job_name', 'link_url', 'apply_url', 'job_id',
+                      'salaryRange', 'equityRange', 'minExperience', 'minSchoolYear', 'visa', 'jobType', 'location', 'is_remote',
+                      'hiring_description', 'job_description', 'salary_min', 'salary_max']
+    
+    def __init__(self, session=None, detail_concurrency=DETAIL_CONCURRENCY, detail_bucket=None, detail_cache_dir=DETAIL_CACHE_DIR,
+                 deadline=None):
+        """
+        Args:
+            session: 共享的HTTP会话（None表示在第一次同步请求时创建自己的会话，异步爬取时不创建）
+            detail_concurrency: 同时获取的职位详情页数量
+            detail_bucket: 职位详情页请求的令牌桶（None表示使用进程内共用的DETAIL_BUCKET），避免请求过于频繁
+            detail_cache_dir: 职位详情磁盘缓存目录（None表示不缓存；未安装diskcache时也不缓存）
+            deadline: 同步爬取的截止时间（time.monotonic()的值，None表示不限时），超过后抛出ScrapeTimeout
+        """
+        # 未传入会话时在第一次同步请求时创建自己的会话（见session属性），同一公司的所有页面请求复用连接
+        self._session = session
+        self.detail_concurrency = detail_concurrency
+        # 令牌桶按速率放行请求；各实例共用同一个桶，并发爬取多家公司时总速率也不超过上限
+        self.detail_bucket = detail_bucket if detail_bucket is not None else DETAIL_BUCKET
+        # 按职位URL缓存解析结果，重复运行时命中缓存的职位不再下载和解析详情页
+        self.detail_cache = open_detail_cache(detail_cache_dir) if diskcache is not None and detail_cache_dir else None
+        self.deadline = deadline
+        self.headers = DEFAULT_HEADERS
         self.base_url = "https://www.ycombinator.com"
         self.apply_base_url = "https://www.workatastartup.com/jobs/"
     
+    @property
+    def session(self):
+        """
+        同步请求使用的HTTP会话，未传入时在第一次使用时创建（公司页面先于详情页获取，不会在多个线程中同时创建）
+        """
+        if self._session is None:
+            self._session = create_session()
+        return self._session
+    
+    def check_deadline(self):
+        """
+        超过截止时间时抛出ScrapeTimeout；正在进行的请求无法中断，只在请求之间检查
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise ScrapeTimeout("爬取超时")
+    
     def get_company_name(self, url):
         """
         从URL中提取公司名称
         """
-        # 从URL中提取公司名称
-        company_match = re.search(r'/companies/([^/]+)', url)
-        if company_match:
-            return company_match.group(1).capitalize()
+        # 取 /companies/ 之后到下一个 / 之前的部分
+        _, found, tail = url.partition('/companies/')
+        name = tail.partition('/')[0]
+        if found and name:
+            return name.capitalize()
         return "未知公司"
     
-    def fetch_page(self, url, max_retries=3, retry_delay=2):
+    def fetch_page(self, url, stop_when_complete=False):
         """
-        获取页面内容，带有重试机制
+        获取页面内容，失败重试由会话的urllib3 Retry策略负责
+        stop_when_complete为True时流式下载职位详情页，解析所需的字段都出现后不再下载剩余内容
         """
-        retries = 0
-        while retries < max_retries:
-            try:
-                print(f"正在获取页面: {url} (尝试 {retries + 1}/{max_retries})")
-                response = requests.get(url, headers=self.headers, timeout=10)
+        try:
+            logger.debug("正在获取页面: %s", url)
+            if not stop_when_complete:
+                response = self.session.get(url, timeout=10)
                 response.raise_for_status()
                 return response.text
-            except requests.exceptions.Timeout:
-                print(f"请求超时，正在重试...")
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 504:
-                    print(f"服务器网关超时 (504)，正在重试...")
-                else:
-                    print(f"HTTP错误: {e}")
-                    return None
-            except Exception as e:
-                print(f"获取页面时出错: {str(e)}")
-                return None
             
-            retries += 1
-            if retries < max_retries:
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
-                # 每次重试增加延迟时间
-                retry_delay *= 1.5
-        
-        print(f"达到最大重试次数 ({max_retries})，无法获取页面")
+            with self.session.get(url, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                # 响应未声明编码时按UTF-8解码
+                response.encoding = response.encoding or 'utf-8'
+                page = _DetailPageBuffer()
+                for chunk in response.iter_content(_STREAM_CHUNK_SIZE, decode_unicode=True):
+                    if page.feed(chunk):
+                        break
+                return page.text
+        except requests.exceptions.RetryError:
+            logger.error("服务器错误，重试后仍然失败: %s", url)
+        except requests.exceptions.Timeout:
+            logger.error("请求超时，重试后仍然失败: %s", url)
+        except requests.exceptions.HTTPError as e:
+            logger.error("HTTP错误: %s", e)
+        except Exception as e:
+            logger.error("获取页面时出错: %s", e)
         return None
     
     def parse_job_links(self, html, company_url):
         """
         从公司职位页面解析所有职位链接
+        安装了lxml时直接用XPath查找元素，不构建BeautifulSoup对象树
         """
         if not html:
             return []
             
-        soup = BeautifulSoup(html, 'html.parser')
+        tree = lxml_html.document_fromstring(html) if lxml_html is not None else BeautifulSoup(html, HTML_PARSER)
         company_name = self.get_company_name(company_url)
         job_links = []
         
         # 方法1: 查找所有职位卡片
-        print("正在查找职位链接...")
-        job_cards = soup.select('div.job')
+        logger.debug("正在查找职位链接...")
+        job_cards = self._find_job_cards(tree)
         
         if job_cards:
-            print(f"找到 {len(job_cards)} 个职位卡片")
+            logger.info("找到 %d 个职位卡片", len(job_cards))
             for card in job_cards:
                 try:
-                    title_element = card.select_one('h4.job-title')
-                    link_element = card.select_one('a')
+                    title, link = self._read_job_card(card)
                     
-                    if title_element and link_element and 'href' in link_element.attrs:
-                        title = title_element.text.strip()
-                        link = link_element['href']
+                    if title is not None and link is not None:
                         if not link.startswith('http'):
                             link = self.base_url + link
                         
@@ -97,39 +465,29 @@ class YCombinatorJobScraper:
                             "job_name": title,
                             "link_url": link
                         })
-                        print(f"找到职位: {title} -> {link}")
+                        logger.debug("找到职位: %s -> %s", title, link)
                 except Exception as e:
-                    print(f"解析职位卡片时出错: {str(e)}")
+                    logger.warning("解析职位卡片时出错: %s", e)
         
         # 方法2: 查找所有可能的职位链接
         if not job_links:
-            print("尝试查找所有可能的职位链接...")
-            links = soup.find_all('a', href=re.compile(rf'/companies/{company_name.lower()}/jobs/[^/]+$', re.IGNORECASE))
+            logger.debug("尝试查找所有可能的职位链接...")
+            href_pattern = _company_job_href_re(company_name.lower())
+            # 先在职位列表容器内查找，容器内没有匹配时再扫描整个页面
+            root = self._find_jobs_container(tree)
+            links = self._find_job_anchors(root, href_pattern) if root is not None else []
+            if not links:
+                links = self._find_job_anchors(tree, href_pattern)
             
             for link in links:
                 try:
-                    href = link['href']
-                    # 尝试找到职位标题
-                    title = None
-                    
-                    # 尝试从链接文本中获取标题
-                    if link.text.strip():
-                        title = link.text.strip()
-                    
-                    # 尝试从附近的h4元素获取标题
-                    if not title:
-                        parent = link.parent
-                        for _ in range(3):  # 向上查找3层
-                            if parent:
-                                title_elem = parent.find('h4')
-                                if title_elem:
-                                    title = title_elem.text.strip()
-                                    break
-                                parent = parent.parent
+                    href = link.get('href')
+                    # 尝试从链接文本或附近的h4元素获取标题
+                    title = self._read_anchor_title(link)
                     
                     # 如果仍然没有标题，从URL中提取
                     if not title:
-                        title_match = re.search(r'/jobs/[^-]+-(.+)$', href)
+                        title_match = _JOB_TITLE_FROM_URL_RE.search(href)
                         if title_match:
                             title = title_match.group(1).replace('-', ' ').title()
                         else:
@@ -143,51 +501,141 @@ class YCombinatorJobScraper:
                         "job_name": title,
                         "link_url": href
                     })
-                    print(f"找到职位: {title} -> {href}")
+                    logger.debug("找到职位: %s -> %s", title, href)
                 except Exception as e:
-                    print(f"解析职位链接时出错: {str(e)}")
+                    logger.warning("解析职位链接时出错: %s", e)
         
         return job_links
     
+    @staticmethod
+    def _find_job_cards(tree):
+        """
+        查找所有职位卡片 div.job
+        """
+        if lxml_html is not None:
+            return tree.xpath(f"//div[{_xpath_has_class('job')}]")
+        return tree.select('div.job')
+    
+    @staticmethod
+    def _read_job_card(card):
+        """
+        返回职位卡片的 (标题, 链接)，缺少标题或链接时返回 (None, None)
+        """
+        if lxml_html is not None:
+            title_elements = card.xpath(f".//h4[{_xpath_has_class('job-title')}]")
+            link_elements = card.xpath('.//a')
+            if title_elements and link_elements and 'href' in link_elements[0].attrib:
+                return title_elements[0].text_content().strip(), link_elements[0].get('href')
+            return None, None
+        
+        title_element = card.select_one('h4.job-title')
+        link_element = card.select_one('a')
+        if title_element and link_element and 'href' in link_element.attrs:
+            return title_element.text.strip(), link_element['href']
+        return None, None
+    
+    @staticmethod
+    def _find_jobs_container(tree):
+        """
+        返回页面中第一个职位列表容器（class含jobs的div、main或section#jobs），找不到时返回None
+        """
+        if lxml_html is not None:
+            containers = tree.xpath("(//div[contains(@class, 'jobs')] | //main | //section[@id='jobs'])[1]")
+            return containers[0] if containers else None
+        return tree.select_one('div[class*="jobs"], main, section#jobs')
+    
+    @staticmethod
+    def _find_job_anchors(tree, href_pattern):
+        """
+        查找href匹配职位链接格式的所有<a>元素
+        """
+        if lxml_html is not None:
+            return [a for a in tree.xpath('.//a[@href]') if href_pattern.search(a.get('href'))]
+        return tree.find_all('a', href=href_pattern)
+    
+    @staticmethod
+    def _read_anchor_title(link):
+        """
+        优先使用链接文本作为职位标题，否则向上查找3层内的h4元素，都没有时返回None
+        """
+        if lxml_html is not None:
+            title = link.text_content().strip()
+            if title:
+                return title
+            parent = link.getparent()
+            for _ in range(3):  # 向上查找3层
+                if parent is None:
+                    break
+                title_elem = parent.find('.//h4')
+                if title_elem is not None:
+                    return title_elem.text_content().strip()
+                parent = parent.getparent()
+            return None
+        
+        title = link.text.strip()
+        if title:
+            return title
+        parent = link.parent
+        for _ in range(3):  # 向上查找3层
+            if not parent:
+                break
+            title_elem = parent.find('h4')
+            if title_elem:
+                return title_elem.text.strip()
+            parent = parent.parent
+        return None
+    
     @staticmethod
     def parse_range_simple(s):
         """
         从字符串中提取数字范围
         例如: "$100K - $165K" -> [100, 165]
         """
-        # 只保留数字、小数点和 -
-        cleaned = re.sub(r'[^0-9\.\-]', '', s)
-        parts = cleaned.split('-')
-        numbers = [float(p) for p in parts if p]  # 去掉空值并转成浮点数
-        return numbers
+        # 去掉千位分隔符后一次找出所有数字并转成浮点数
+        return list(map(float, _NUMBER_RE.findall(s.replace(',', ''))))
     
     def extract_job_details(self, job_url):
         """
         从职位详情页面提取job_id和其他详细信息
+        命中缓存时不下载页面，返回的html为None
         """
-        # 从URL中提取职位标识符
-        job_identifier = job_url.split('/')[-1]
+        cached = self._get_cached_job_details(job_url)
+        if cached is not None:
+            return cached[0], cached[1], None
         
-        # 从页面中提取job_id和其他信息
-        html = self.fetch_page(job_url)
+        # 从页面中提取job_id和其他信息，请求前先从令牌桶取令牌，避免请求过于频繁
+        self.detail_bucket.acquire()
+        html = self.fetch_page(job_url, stop_when_complete=True)
         if not html:
             return None, {}, None
         
+        job_id, job_details = self.parse_job_details(html)
+        self._cache_job_details(job_url, job_id, job_details)
+        return job_id, job_details, html
+    
+    def _get_cached_job_details(self, job_url):
+        """
+        返回缓存的 (job_id, 职位详情)，未命中时返回None
+        """
+        if self.detail_cache is None:
+            return None
+        return self.detail_cache.get(job_url)
+    
+    def _cache_job_details(self, job_url, job_id, job_details):
+        """
+        缓存职位详情页的解析结果，到期后重新获取
+        """
+        if self.detail_cache is not None:
+            self.detail_cache.set(job_url, (job_id, job_details), expire=DETAIL_CACHE_TTL)
+    
+    def parse_job_details(self, html):
+        """
+        从职位详情页面的HTML中解析job_id和职位详情
+        """
         # 提取job_id
-        job_id = None
-        # 从页面中查找signup_job_id，考虑URL编码的情况
-        signup_job_id_patterns = [
-            r'signup_job_id=(\d+)',           # 标准格式
-            r'signup_job_id%3D(\d+)',         # URL编码格式 %3D 是等号的编码
-            r'signup_job_id%253D(\d+)'        # 双重URL编码格式
-        ]
-        
-        for pattern in signup_job_id_patterns:
-            signup_job_id_matches = re.findall(pattern, html)
-            if signup_job_id_matches:
-                job_id = signup_job_id_matches[0]
-                print(f"使用模式 '{pattern}' 找到signup_job_id: {job_id}")
-                break
+        job_id, separator = _find_signup_job_id(html)
+        if job_id:
+            logger.debug("使用格式 'signup_job_id%s' 找到signup_job_id: %s", separator, job_id)
         
         # 初始化职位详情
         job_details = {
@@ -207,44 +655,36 @@ class YCombinatorJobScraper:
         
         # 直接从页面源码中提取结构化的职位信息
         # 查找包含所有字段的JSON结构（包括新增的jobType和location）
-        json_pattern = r'salaryRange&quot;:&quot;(.*?)&quot;,&quot;equityRange&quot;:&quot;(.*?)&quot;,&quot;minExperience&quot;:&quot;(.*?)&quot;,&quot;minSchoolYear&quot;:&quot;(.*?)&quot;,&quot;visa&quot;:&quot;(.*?)&quot;'
-        json_match = re.search(json_pattern, html)
+        json_match = _JOB_JSON_RE.search(html)
         
         # 从HTML结构中提取Location和Job Type
-        # 格式: <div><strong>Location</strong></div><span>San Francisco, CA </span>
-        location_pattern = r'<div><strong>Location</strong></div><span>(.*?)</span>'
-        location_match = re.search(location_pattern, html)
-        if location_match:
-            job_details["location"] = location_match.group(1).strip()
-            print(f"找到工作地点: '{job_details['location']}'")
-        
-        # 格式: <div><strong>Job Type</strong></div><span>Full-time</span>
-        job_type_pattern = r'<div><strong>Job Type</strong></div><span>(.*?)</span>'
-        job_type_match = re.search(job_type_pattern, html)
-        if job_type_match:
-            job_details["jobType"] = job_type_match.group(1).strip()
-            print(f"找到职位类型: '{job_details['jobType']}'")
+        labeled_fields = _find_labeled_fields(html)
+        if 'Location' in labeled_fields:
+            job_details["location"] = labeled_fields['Location'].strip()
+            logger.debug("找到工作地点: '%s'", job_details['location'])
+        
+        if 'Job Type' in labeled_fields:
+            job_details["jobType"] = labeled_fields['Job Type'].strip()
+            logger.debug("找到职位类型: '%s'", job_details['jobType'])
         
         # 提取hiring_description字段
-        hiring_description_pattern = r'hiring_description&quot;:&quot;(.*?)&quot;'
-        hiring_description_match = re.search(hiring_description_pattern, html)
+        hiring_description_match = _HIRING_DESCRIPTION_RE.search(html)
         if hiring_description_match:
             job_details["hiring_description"] = hiring_description_match.group(1)
-            print(f"找到招聘描述: '{job_details['hiring_description'][:100]}...'")
+            logger.debug("找到招聘描述: '%.100s...'", job_details['hiring_description'])
         
         # 提取job_description字段（从meta标签中）
-        job_description_pattern = r'<meta[^>]*content="([^"]*)"[^>]*name="description"[^>]*>'
-        job_description_match = re.search(job_description_pattern, html, re.DOTALL)
+        job_description_match = _JOB_DESCRIPTION_RE.search(html)
         if job_description_match:
             content = job_description_match.group(1)
             # 检查内容是否以"Job Description"开头
             if content.startswith("Job Description"):
                 # 提取"Job Description"之后的内容
                 job_details["job_description"] = content[len("Job Description"):].strip()
-                print(f"找到职位描述: '{job_details['job_description'][:100]}...'")
+                logger.debug("找到职位描述: '%.100s...'", job_details['job_description'])
         
         if json_match:
-            print("从页面源码中找到结构化的职位信息")
+            logger.debug("从页面源码中找到结构化的职位信息")
             salaryRange = json_match.group(1)
             salary_min, salary_max = '', ''
             if salaryRange:
@@ -268,7 +708,7 @@ class YCombinatorJobScraper:
                     experience_years = "0"
                 else:
                     #提取minExperience中的数字，如6+ years
-                    experience_match = re.search(r'(\d+)', minExperience)
+                    experience_match = _EXPERIENCE_YEARS_RE.search(minExperience)
                     if experience_match:
                         experience_years = experience_match.group(1)
                         minExperience = experience_years
@@ -279,99 +719,215 @@ class YCombinatorJobScraper:
             job_details["visa"] = json_match.group(5)
             
             # 打印提取到的信息
-            print(f"薪资范围: '{job_details['salaryRange']}'")
-            print(f"股权范围: '{job_details['equityRange']}'")
-            print(f"最低经验: '{job_details['minExperience']}'")
-            print(f"最低学历: '{job_details['minSchoolYear']}'")
-            print(f"签证支持: '{job_details['visa']}'")
+            logger.debug("薪资范围: '%s'", job_details['salaryRange'])
+            logger.debug("股权范围: '%s'", job_details['equityRange'])
+            logger.debug("最低经验: '%s'", job_details['minExperience'])
+            logger.debug("最低学历: '%s'", job_details['minSchoolYear'])
+            logger.debug("签证支持: '%s'", job_details['visa'])
             
             # 直接返回提取到的信息，不进行任何推断或默认值设置
-            return job_id, job_details, html
+            return job_id, job_details
         
         # 如果没有找到结构化数据，直接返回空值，不进行推断
-        print("未找到结构化的职位信息，返回空值")
-        return job_id, job_details, html
+        logger.debug("未找到结构化的职位信息，返回空值")
+        return job_id, job_details
     
-    def scrape_jobs(self, company_url):
+    def _apply_job_details(self, job, job_id, job_details):
         """
-        爬取公司的所有职位信息
+        将解析出的job_id和职位详情写入职位记录
+        """
+        if job_id:
+            job['job_id'] = job_id
+            job['apply_url'] = f"{self.apply_base_url}{job_id}"
+        else:
+            job['job_id'] = "未知"
+            job['apply_url'] = "未找到申请链接"
+        
+        # 添加职位详情
+        job['salaryRange'] = job_details.get('salaryRange', '')
+        job['equityRange'] = job_details.get('equityRange', '')
+        job['minExperience'] = job_details.get('minExperience', '')
+        job['minSchoolYear'] = job_details.get('minSchoolYear', '')
+        job['visa'] = job_details.get('visa', '')
+        job['jobType'] = job_details.get('jobType', '')
+        job['location'] = job_details.get('location', '')
+        # 添加is_remote字段，根据location是否包含"Remote"来判断
+        job['is_remote'] = 'Remote' in job_details.get('location', '')
+        job['hiring_description'] = job_details.get('hiring_description', '')
+        job['job_description'] = job_details.get('job_description', '')
+        # 添加提取的数值字段
+        job['salary_min'] = job_details.get('salary_min', '')
+        job['salary_max'] = job_details.get('salary_max', '')
+    
+    @staticmethod
+    def _apply_job_error(job):
+        """
+        处理职位出错时填充的占位字段
+        """
+        job['job_id'] = "错误"
+        job['apply_url'] = "处理时出错"
+        job['salaryRange'] = ""
+        job['equityRange'] = ""
+        job['minExperience'] = ""
+        job['minSchoolYear'] = ""
+        job['visa'] = ""
+        job['jobType'] = ""
+        job['location'] = ""
+        job['hiring_description'] = ""
+        job['job_description'] = ""
+    
+    @staticmethod
+    def _normalize_jobs_url(company_url):
+        """
+        确保URL以/jobs结尾
         """
-        # 确保URL以/jobs结尾
         if not company_url.endswith('/jobs'):
             company_url = company_url.rstrip('/') + '/jobs'
+        return company_url
+    
+    def scrape_jobs(self, company_url):
+        """
+        爬取公司的所有职位信息
+        """
+        company_url = self._normalize_jobs_url(company_url)
         
         # 获取公司职位页面
         html = self.fetch_page(company_url)
         if not html:
-            print(f"无法获取公司职位页面: {company_url}")
+            logger.error("无法获取公司职位页面: %s", company_url)
             return []
         
         # 解析职位链接
         job_links = self.parse_job_links(html, company_url)
         if not job_links:
-            print(f"未在 {company_url} 找到任何职位")
+            logger.info("未在 %s 找到任何职位", company_url)
             return []
+        self.check_deadline()
         
-        # 获取每个职位的详细信息
-        print(f"\n正在获取每个职位的详细信息...")
-        for job in job_links:
+        # 并发获取每个职位的详细信息，结果直接写入各自的职位记录，顺序不变
+        logger.info("正在获取 %d 个职位的详细信息...", len(job_links))
+        with ThreadPoolExecutor(max_workers=self.detail_concurrency) as executor:
+            list(executor.map(self._scrape_job_detail, job_links))
+        
+        return job_links
+    
+    def _scrape_job_detail(self, job):
+        """
+        获取并填充单个职位的详细信息，出错时填充占位字段
+        超过截止时间时抛出ScrapeTimeout，剩余的职位也随之跳过
+        """
+        self.check_deadline()
+        try:
+            logger.debug("处理职位: %s", job['job_name'])
+            job_id, job_details, _ = self.extract_job_details(job['link_url'])
+            self._apply_job_details(job, job_id, job_details)
+        except Exception as e:
+            logger.warning("处理职位 %s 时出错: %s", job['job_name'], e)
+            self._apply_job_error(job)
+    
+    async def fetch_page_async(self, session, url, max_retries=3, retry_delay=2, stop_when_complete=False):
+        """
+        fetch_page的异步版本，使用aiohttp会话获取页面内容
+        """
+        retries = 0
+        while retries < max_retries:
             try:
-                print(f"\n处理职位: {job['job_name']}")
-                job_id, job_details, _ = self.extract_job_details(job['link_url'])
-                
-                if job_id:
-                    job['job_id'] = job_id
-                    job['apply_url'] = f"{self.apply_base_url}{job_id}"
-                else:
-                    job['job_id'] = "未知"
-                    job['apply_url'] = "未找到申请链接"
-                
-                # 添加职位详情
-                job['salaryRange'] = job_details.get('salaryRange', '')
-                job['equityRange'] = job_details.get('equityRange', '')
-                job['minExperience'] = job_details.get('minExperience', '')
-                job['minSchoolYear'] = job_details.get('minSchoolYear', '')
-                job['visa'] = job_details.get('visa', '')
-                job['jobType'] = job_details.get('jobType', '')
-                job['location'] = job_details.get('location', '')
-                # 添加is_remote字段，根据location是否包含"Remote"来判断
-                job['is_remote'] = 'Remote' in job_details.get('location', '')
-                job['hiring_description'] = job_details.get('hiring_description', '')
-                job['job_description'] = job_details.get('job_description', '')
-                # 添加提取的数值字段
-                job['salary_min'] = job_details.get('salary_min', '')
-                job['salary_max'] = job_details.get('salary_max', '')
-                
-                # 添加延迟，避免请求过于频繁
-                time.sleep(2)
+                logger.debug("正在获取页面: %s (尝试 %d/%d)", url, retries + 1, max_retries)
+                async with session.get(url, headers=self.headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    if response.status in _RETRY_STATUS_CODES:
+                        logger.warning("服务器错误 (%d)，正在重试: %s", response.status, url)
+                    else:
+                        response.raise_for_status()
+                        if not stop_when_complete:
+                            return await response.text()
+                        
+                        decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+                        page = _DetailPageBuffer()
+                        async for chunk in response.content.iter_chunked(_STREAM_CHUNK_SIZE):
+                            if page.feed(decoder.decode(chunk)):
+                                break
+                        else:
+                            page.feed(decoder.decode(b'', final=True))
+                        return page.text
+            except asyncio.TimeoutError:
+                logger.warning("请求超时，正在重试: %s", url)
+            except aiohttp.ClientResponseError as e:
+                logger.error("HTTP错误: %s", e)
+                return None
             except Exception as e:
-                print(f"处理职位 {job['job_name']} 时出错: {str(e)}")
-                job['job_id'] = "错误"
-                job['apply_url'] = "处理时出错"
-                job['salaryRange'] = ""
-                job['equityRange'] = ""
-                job['minExperience'] = ""
-                job['minSchoolYear'] = ""
-                job['visa'] = ""
-                job['jobType'] = ""
-                job['location'] = ""
-                job['hiring_description'] = ""
-                job['job_description'] = ""
+                logger.error("获取页面时出错: %s", e)
+                return None
+            
+            retries += 1
+            if retries < max_retries:
+                logger.debug("等待 %s 秒后重试...", retry_delay)
+                await asyncio.sleep(retry_delay)
+                # 每次重试增加延迟时间
+                retry_delay *= 1.5
+        
+        logger.error("达到最大重试次数 (%d)，无法获取页面: %s", max_retries, url)
+        return None
+    
+    async def scrape_jobs_async(self, company_url, session):
+        """
+        scrape_jobs的异步版本，等待网络期间让出事件循环给其他公司的爬取任务
+        """
+        company_url = self._normalize_jobs_url(company_url)
+        
+        # 获取公司职位页面
+        html = await self.fetch_page_async(session, company_url)
+        if not html:
+            logger.error("无法获取公司职位页面: %s", company_url)
+            return []
+        
+        # 解析职位链接
+        job_links = self.parse_job_links(html, company_url)
+        if not job_links:
+            logger.info("未在 %s 找到任何职位", company_url)
+            return []
+        
+        # 并发获取每个职位的详细信息，并发数由信号量限制
+        logger.info("正在获取 %d 个职位的详细信息...", len(job_links))
+        semaphore = asyncio.Semaphore(self.detail_concurrency)
+        await asyncio.gather(*(self._scrape_job_detail_async(session, job, semaphore) for job in job_links))
         
         return job_links
     
+    async def _scrape_job_detail_async(self, session, job, semaphore):
+        """
+        _scrape_job_detail的异步版本
+        """
+        async with semaphore:
+            try:
+                logger.debug("处理职位: %s", job['job_name'])
+                cached = self._get_cached_job_details(job['link_url'])
+                if cached is not None:
+                    self._apply_job_details(job, *cached)
+                    return
+                
+                await self.detail_bucket.acquire_async()
+                detail_html = await self.fetch_page_async(session, job['link_url'], stop_when_complete=True)
+                if detail_html:
+                    job_id, job_details = self.parse_job_details(detail_html)
+                    self._cache_job_details(job['link_url'], job_id, job_details)
+                else:
+                    job_id, job_details = None, {}
+                self._apply_job_details(job, job_id, job_details)
+            except Exception as e:
+                logger.warning("处理职位 %s 时出错: %s", job['job_name'], e)
+                self._apply_job_error(job)
+    
     def save_to_csv(self, jobs, filename=None, append_mode=False):
         """
         将职位数据保存为CSV文件（支持追加模式，文件名包含日期）
         """
         if not jobs:
-            print("没有职位数据可保存")
+            logger.info("没有职位数据可保存")
             return
         
         # 确保result目录存在
         result_dir = "result"
-        if not os.path.exists(result_dir):
-            os.makedirs(result_dir)
+        os.makedirs(result_dir, exist_ok=True)
         
         # 生成带日期的文件名
         if filename is None:
@@ -388,77 +944,68 @@ class YCombinatorJobScraper:
         # 根据模式选择写入方式
         mode = 'a' if append_mode and file_exists else 'w'
         
-        with open(filepath, mode, newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['company', 'job_name', 'link_url', 'apply_url', 'job_id', 
-                         'salaryRange', 'equityRange', 'minExperience', 'minSchoolYear', 'visa', 'jobType', 'location', 'is_remote',
-                         'hiring_description', 'job_description', 'salary_min', 'salary_max']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        # 先按列顺序转换为行列表，再用1MB缓冲一次性写入
+        fieldnames = self.CSV_FIELDNAMES
+        rows = [[job.get(key, '') for key in fieldnames] for job in jobs]
+        with open(filepath, mode, newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+            writer = csv.writer(csvfile)
             
             # 只在需要时写入表头
             if write_header:
-                writer.writeheader()
+                writer.writerow(fieldnames)
             
-            writer.writerows(jobs)
+            writer.writerows(rows)
         
         action = "追加到" if append_mode and file_exists else "保存到"
-        print(f"数据已成功{action} {filepath}，新增 {len(jobs)} 条记录")
+        logger.info("数据已成功%s %s，新增 %d 条记录", action, filepath, len(jobs))
         return filepath
     
     def save_to_json(self, jobs, company_name, append_mode=False):
         """
         将职位数据保存为JSON文件（支持追加模式，文件名包含日期）
+        汇总文件为JSON Lines格式（每行一条职位记录），追加时不需要读取和重写已有内容
         """
         if not jobs:
-            print("没有职位数据可保存")
+            logger.info("没有职位数据可保存")
             return
         
         # 确保result目录存在
         result_dir = "result"
-        if not os.path.exists(result_dir):
-            os.makedirs(result_dir)
+        os.makedirs(result_dir, exist_ok=True)
         
         today = datetime.datetime.now().strftime("%Y%m%d")
         
         # 1. 保存到主文件（带日期）
-        main_filename = f"all_jobs_{today}.json"
+        main_filename = f"all_jobs_{today}.jsonl"
         main_filepath = os.path.join(result_dir, main_filename)
         
-        if append_mode and os.path.exists(main_filepath):
-            # 追加模式：读取现有数据，合并后写入
-            try:
-                with open(main_filepath, 'r', encoding='utf-8') as jsonfile:
-                    existing_jobs = json.load(jsonfile)
-                if not isinstance(existing_jobs, list):
-                    existing_jobs = []
-            except (json.JSONDecodeError, FileNotFoundError):
-                existing_jobs = []
-            
-            # 合并数据
-            all_jobs = existing_jobs + jobs
-            
-            with open(main_filepath, 'w', encoding='utf-8') as jsonfile:
-                json.dump(all_jobs, jsonfile, ensure_ascii=False, indent=2)
-            
-            print(f"数据已成功追加到 {main_filepath}，新增 {len(jobs)} 条记录，总计 {len(all_jobs)} 条记录")
+        # 追加模式直接在文件末尾写入新记录；覆盖模式重新创建文件
+        if orjson is not None:
+            lines = b''.join(orjson.dumps(job) + b'\n' for job in jobs)
         else:
-            # 覆盖模式或文件不存在
-            with open(main_filepath, 'w', encoding='utf-8') as jsonfile:
-                json.dump(jobs, jsonfile, ensure_ascii=False, indent=2)
-            
-            print(f"数据已成功保存到 {main_filepath}，共 {len(jobs)} 条记录")
+            lines = ''.join(json.dumps(job, ensure_ascii=False) + '\n' for job in jobs).encode('utf-8')
+        if append_mode:
+            with open(main_filepath, 'ab') as jsonfile:
+                jsonfile.write(lines)
+        else:
+            _write_bytes_atomic(main_filepath, lines)
+        
+        action = "追加到" if append_mode else "保存到"
+        logger.info("数据已成功%s %s，新增 %d 条记录", action, main_filepath, len(jobs))
         
         # 2. 保存单公司结果到result/jobs_info文件夹
         jobs_info_dir = os.path.join(result_dir, "jobs_info")
-        if not os.path.exists(jobs_info_dir):
-            os.makedirs(jobs_info_dir)
-            print(f"创建目录: {jobs_info_dir}")
+        os.makedirs(jobs_info_dir, exist_ok=True)
         
         company_filename = f"{company_name.lower()}_{today}.json"
         company_filepath = os.path.join(jobs_info_dir, company_filename)
-        with open(company_filepath, 'w', encoding='utf-8') as jsonfile:
-            json.dump(jobs, jsonfile, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            snapshot = orjson.dumps(jobs, option=orjson.OPT_INDENT_2)
+        else:
+            snapshot = json.dumps(jobs, ensure_ascii=False, indent=2).encode('utf-8')
+        _write_bytes_atomic(company_filepath, snapshot)
         
-        print(f"单公司数据已保存到 {company_filepath}，共 {len(jobs)} 条记录")
+        logger.info("单公司数据已保存到 %s，共 %d 条记录", company_filepath, len(jobs))
         
         return main_filepath, company_filepath
     
@@ -492,25 +1039,84 @@ class YCombinatorJobScraper:
             print("-" * 50)
 
 
+def save_jobs(scraper, jobs, company_url, append_mode=False):
+    """
+    保存职位数据到汇总CSV/JSON文件和单公司JSON文件
+    返回 (CSV文件路径, 主JSON文件路径, 单公司JSON文件路径)
+    """
+    company_name = scraper.get_company_name(company_url)
+    
+    # 批量并发爬取时汇总文件会被多个线程/进程追加，写入期间持有锁
+    with _SAVE_LOCK, output_file_lock():
+        # 保存到带日期的CSV文件（支持追加模式）
+        csv_filename = scraper.save_to_csv(jobs, filename=None, append_mode=append_mode)
+        
+        # 保存到带日期的JSON文件（支持追加模式）
+        main_json_filename, company_json_filename = scraper.save_to_json(jobs, company_name, append_mode=append_mode)
+    
+    return csv_filename, main_json_filename, company_json_filename
+
+
+def scrape(company_url, append=True, session=None, detail_bucket=None, deadline=None):
+    """
+    爬取单个公司的职位信息并保存结果，返回职位列表
+    供batch_scraper在进程内直接调用，避免每家公司启动一个Python解释器
+    session: 可选的共享HTTP会话，批量爬取时在所有公司之间复用连接池
+    detail_bucket: 可选的详情页令牌桶，批量爬取时所有公司共用（None表示使用DETAIL_BUCKET）
+    deadline: 截止时间（time.monotonic()的值），超过后抛出ScrapeTimeout，已爬取的职位不会保存
+    """
+    scraper = YCombinatorJobScraper(session=session, detail_bucket=detail_bucket, deadline=deadline)
+    
+    logger.info("开始爬取 %s 的职位信息...", company_url)
+    jobs = scraper.scrape_jobs(company_url)
+    
+    if jobs:
+        scraper.check_deadline()
+        save_jobs(scraper, jobs, company_url, append_mode=append)
+    return jobs
+
+
+async def scrape_async(company_url, session, append=True, detail_bucket=None):
+    """
+    scrape的异步版本，session为aiohttp.ClientSession
+    保存文件在线程中执行，不阻塞事件循环
+    """
+    scraper = YCombinatorJobScraper(detail_bucket=detail_bucket)
+    
+    logger.info("开始爬取 %s 的职位信息...", company_url)
+    jobs = await scraper.scrape_jobs_async(company_url, session)
+    
+    if jobs:
+        await asyncio.to_thread(save_jobs, scraper, jobs, company_url, append)
+    return jobs
+
+
 def main():
     """
     主函数
     """
+    # 命令行运行时输出INFO及以上级别的日志（batch_scraper的子进程模式从标准输出读取关键信息）
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
     try:
         # 检查命令行参数
         append_mode = False
+        detail_bucket = None
         if len(sys.argv) > 1:
             company_url = sys.argv[1]
             # 检查是否有--append参数
             if len(sys.argv) > 2 and sys.argv[2] == "--append":
                 append_mode = True
                 print("启用追加模式")
+            # --detail-rate=N：本进程每秒最多发起的详情页请求数（batch_scraper的子进程模式按并发数分配总速率）
+            for arg in sys.argv[2:]:
+                if arg.startswith("--detail-rate="):
+                    detail_bucket = TokenBucket(float(arg.partition("=")[2]))
         else:
             # 默认使用Bree公司的URL进行测试
             company_url = "https://www.ycombinator.com/companies/bree"
         
         # 创建爬虫实例
-        scraper = YCombinatorJobScraper()
+        scraper = YCombinatorJobScraper(detail_bucket=detail_bucket)
         
         # 爬取职位信息
         print(f"开始爬取 {company_url} 的职位信息...")
@@ -518,13 +1124,9 @@ def main():
         
         # 保存结果
         if jobs:
-            company_name = scraper.get_company_name(company_url)
-            
-            # 保存到带日期的CSV文件（支持追加模式）
-            csv_filename = scraper.save_to_csv(jobs, filename=None, append_mode=append_mode)
-            
-            # 保存到带日期的JSON文件（支持追加模式）
-            main_json_filename, company_json_filename = scraper.save_to_json(jobs, company_name, append_mode=append_mode)
+            csv_filename, main_json_filename, company_json_filename = save_jobs(
+                scraper, jobs, company_url, append_mode=append_mode
+            )
             
             # 打印职位信息
             scraper.print_jobs(jobs)
@@ -532,7 +1134,7 @@ def main():
             print(f"\n爬取完成! 共找到 {len(jobs)} 个职位。")
             print(f"结果已保存到:")
             print(f"  - 主CSV文件: {csv_filename}")
-            print(f"  - 主JSON文件: {main_json_filename}")
+            print(f"  - 主JSON Lines文件: {main_json_filename}")
             print(f"  - 单公司JSON文件: {company_json_filename}")
         else:
             print("未找到任何职位信息")
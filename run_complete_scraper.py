@@ -9,18 +9,25 @@
 """
 
 import subprocess
+import codecs
 import time
 import datetime
 import os
 import sys
 import logging
-from pathlib import Path
+import argparse
+import fnmatch
+import re
+
+# 子进程输出中需要特别标记的公司爬取进度行，一次扫描匹配所有关键字
+PROGRESS_LINE_RE = re.compile("进度:|成功爬取公司|开始爬取公司")
+# 数据文件名中的日期（和时间），如 all_jobs_20250825.csv、all_jobs_company_info_20250825_143000.csv
+FILE_DATE_PATTERN = re.compile(r'_(\d{8})(?:_(\d{6}))?\.\w+$')
 
 def setup_logging():
     """设置日志配置"""
     log_dir = "logs"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
     
     log_file = os.path.join(log_dir, f"complete_scraper_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
     logging.basicConfig(
@@ -48,7 +55,7 @@ def run_script(script_name, logger):
         
         # 运行脚本并捕获输出
         result = subprocess.run(
-            ["python", script_name], 
+            [sys.executable, script_name], 
             capture_output=True, 
             text=True, 
             check=True,
@@ -82,6 +89,43 @@ def run_script(script_name, logger):
         logger.error(f"❌ {script_name} 运行时发生异常: {str(e)}")
         return False
 
+def run_in_process(step_name, func, logger):
+    """
+    在当前进程中调用模块的入口函数，不再为每个步骤启动新的Python解释器
+    返回 (是否成功, 入口函数的返回值)
+    """
+    logger.info(f"开始运行 {step_name}")
+    start_time = time.time()
+    try:
+        result = func()
+    except SystemExit as e:
+        # 入口函数用sys.exit报告失败，不能让它结束整个流程
+        if e.code not in (None, 0):
+            logger.error(f"❌ {step_name} 运行失败，退出代码: {e.code}")
+            return False, None
+        result = None
+    except Exception as e:
+        logger.error(f"❌ {step_name} 运行时发生异常: {str(e)}")
+        return False, None
+    
+    duration = time.time() - start_time
+    logger.info(f"✅ {step_name} 运行完成，耗时 {duration:.2f} 秒")
+    return True, result
+
+def log_output_lines(script_name, lines, logger):
+    """
+    把子进程输出的一批行合并成一条日志记录，进度相关的行另外单独标记
+    """
+    lines = [line.strip() for line in lines]
+    lines = [line for line in lines if line]
+    if not lines or not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info("\n".join(f"[{script_name}] {line}" for line in lines))
+    for line in lines:
+        # 特别标记公司爬取进度
+        if PROGRESS_LINE_RE.search(line):
+            logger.info(f"🔍 {line}")
+
 def run_script_with_args(script_name, args, logger):
     """
     运行指定的Python脚本（带参数）并实时记录输出
@@ -96,39 +140,35 @@ def run_script_with_args(script_name, args, logger):
             return False
         
         # 构建命令
-        cmd = ["python", script_name] + args
+        # 使用当前的Python解释器，而不是PATH中可能不同的python
+        cmd = [sys.executable, script_name, *args]
         
-        # 使用Popen实现实时输出
+        # 使用Popen实现实时输出，以二进制模式按块读取
         process = subprocess.Popen(
             cmd,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            encoding='utf-8',
-            errors='ignore',
-            bufsize=1,
-            universal_newlines=True
+            bufsize=65536
         )
         
         # 自动回答确认问题
         if process.stdin:
-            process.stdin.write("y\n")
+            process.stdin.write(b"y\n")
             process.stdin.flush()
             process.stdin.close()
         
-        # 实时读取并记录输出
+        # 实时读取并记录输出：read1每次返回管道中已有的数据（最多64KB），
+        # 每块中的完整行合并成一条日志记录，不完整的行留到下一块
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        pending = ''
         while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
                 break
-            if output:
-                line = output.strip()
-                if line:
-                    logger.info(f"[{script_name}] {line}")
-                    # 特别标记公司爬取进度
-                    if "进度:" in line or "成功爬取公司" in line or "开始爬取公司" in line:
-                        logger.info(f"🔍 {line}")
+            *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+            log_output_lines(script_name, lines, logger)
+        log_output_lines(script_name, [pending + decoder.decode(b'', final=True)], logger)
         
         # 等待进程完成
         return_code = process.wait()
@@ -167,32 +207,58 @@ def check_required_files(logger):
     logger.info("所有必需的脚本文件都存在")
     return True
 
+def file_date_key(name):
+    """按文件名中的日期和时间排序用的键，文件名中没有日期时返回None"""
+    match = FILE_DATE_PATTERN.search(name)
+    return None if match is None else match.group(1) + (match.group(2) or '000000')
+
 def get_latest_files(pattern, logger):
     """获取匹配模式的最新文件"""
-    import glob
-    
-    # 首先在result目录中查找
-    result_pattern = os.path.join("result", pattern)
-    result_files = glob.glob(result_pattern)
-    
-    # 然后在根目录中查找
-    root_files = glob.glob(pattern)
+    # 在result目录和根目录中查找；文件名中带日期时按日期取最新的文件，不必读取文件状态，
+    # 都没有日期时按修改时间（scandir的目录项自带文件状态，不必对每个文件再调用getmtime）
+    files = []
+    for directory in ("result", "."):
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+                    path = os.path.join(directory, entry.name) if directory != "." else entry.name
+                    files.append((path, entry))
     
-    # 合并所有文件
-    all_files = result_files + root_files
-    
-    if not all_files:
+    if not files:
         logger.warning(f"未找到匹配模式的文件: {pattern}")
         return None
     
-    latest_file = max(all_files, key=os.path.getmtime)
+    dated = [(file_date_key(entry.name), path) for path, entry in files if file_date_key(entry.name)]
+    if dated:
+        latest_file = max(dated, key=lambda item: item[0])[1]
+    else:
+        latest_file = max(files, key=lambda item: item[1].stat().st_mtime)[0]
+    
     logger.info(f"找到最新文件: {latest_file}")
     return latest_file
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="完整的数据爬取和合并流程")
+    parser.add_argument("--isolated", action="store_true",
+                        help="每个步骤在独立的子进程中运行（旧的执行方式）")
+    return parser.parse_args()
+
 def main():
     """主函数"""
+    args = parse_args()
     logger = setup_logging()
     
+    # 在配置好日志之后再导入各步骤的模块，fetch_yc_companies导入时的basicConfig不会覆盖这里的配置
+    import fetch_yc_companies
+    import batch_scraper
+    import job_scraper_improved
+    import update_jobs_with_company_info_merged
+    
     logger.info("=" * 60)
     logger.info("🚀 开始执行完整的数据爬取和合并流程")
     logger.info("=" * 60)
@@ -206,16 +272,27 @@ def main():
     
     success_count = 0
     total_steps = 3
+    # 进程内运行时各步骤直接传递文件路径和数据；isolated模式或上一步失败时才按文件名查找最新文件
+    companies_file = None
+    companies_df = None
+    jobs_file = None
+    collected_jobs = None
+    merged_file = None
     
     # 步骤1: 爬取hiring companies数据
     logger.info("\n📋 步骤 1/3: 爬取最新的hiring companies数据")
     logger.info("-" * 50)
-    if run_script("fetch_yc_companies.py", logger):
+    if args.isolated:
+        step1_ok = run_script("fetch_yc_companies.py", logger)
+        if step1_ok:
+            companies_file = get_latest_files("all_hiring_companies_*.csv", logger)
+    else:
+        step1_ok, companies_file = run_in_process("fetch_yc_companies", fetch_yc_companies.main, logger)
+    if step1_ok:
         success_count += 1
         # 检查生成的文件
-        latest_companies_file = get_latest_files("all_hiring_companies_*.csv", logger)
-        if latest_companies_file:
-            logger.info(f"✅ 成功生成companies文件: {latest_companies_file}")
+        if companies_file:
+            logger.info(f"✅ 成功生成companies文件: {companies_file}")
         else:
             logger.warning("⚠️ 未找到生成的companies文件")
     else:
@@ -225,13 +302,17 @@ def main():
     logger.info("\n💼 步骤 2/3: 爬取最新的jobs数据")
     logger.info("-" * 50)
     
-    # 读取companies文件获取实际公司数量
+    # 读取companies文件获取实际公司数量，进程内运行时步骤3直接复用读取的数据
     import pandas as pd
     companies_count = 0
     try:
-        latest_companies_file = get_latest_files("all_hiring_companies_*.csv", logger)
-        if latest_companies_file:
-            companies_df = pd.read_csv(latest_companies_file)
+        companies_file = companies_file or get_latest_files("all_hiring_companies_*.csv", logger)
+        if companies_file:
+            companies_df = update_jobs_with_company_info_merged.read_csv_file(
+                companies_file,
+                usecols=update_jobs_with_company_info_merged.keep_company_column,
+                dtype=update_jobs_with_company_info_merged.COMPANIES_DTYPES
+            )
             companies_count = len(companies_df)
             logger.info(f"检测到 {companies_count} 家公司，将爬取前100家公司的职位数据")
         else:
@@ -245,35 +326,73 @@ def main():
     end_index = companies_count - 1 if companies_count > 0 else 1275
     total_companies = end_index + 1
     
-    # 计算预计时间（每家公司平均15秒，包括爬取时间和间隔）
-    estimated_seconds = total_companies * 15
-    estimated_hours = estimated_seconds // 3600
-    estimated_minutes = (estimated_seconds % 3600) // 60
-    
-    logger.info(f"将爬取所有 {companies_count} 家公司的职位数据（索引0-{end_index}）")
-    logger.info(f"预计耗时: {estimated_hours}小时{estimated_minutes}分钟 (约{estimated_seconds}秒)")
-    logger.info(f"预计完成时间: {(datetime.datetime.now() + datetime.timedelta(seconds=estimated_seconds)).strftime('%Y-%m-%d %H:%M:%S')}")
+    # 计算预计时间（每家公司平均15秒，包括爬取时间和间隔），只在会输出INFO日志时计算和格式化
+    if logger.isEnabledFor(logging.INFO):
+        estimated_seconds = total_companies * 15
+        estimated_hours = estimated_seconds // 3600
+        estimated_minutes = (estimated_seconds % 3600) // 60
+        
+        logger.info(f"将爬取所有 {companies_count} 家公司的职位数据（索引0-{end_index}）")
+        logger.info(f"预计耗时: {estimated_hours}小时{estimated_minutes}分钟 (约{estimated_seconds}秒)")
+        logger.info(f"预计完成时间: {(datetime.datetime.now() + datetime.timedelta(seconds=estimated_seconds)).strftime('%Y-%m-%d %H:%M:%S')}")
     
-    if run_script_with_args("batch_scraper.py", ["run", "0", str(end_index), "1"], logger):
+    if args.isolated:
+        step2_ok = run_script_with_args("batch_scraper.py", ["run", "0", str(end_index), "1"], logger)
+        if step2_ok:
+            jobs_file = get_latest_files("all_jobs_[0-9]*.csv", logger)
+    else:
+        # 与 batch_scraper.py run 0 end_index 1 相同的参数；批量爬取日志同时写入本流程的日志文件，
+        # 爬取到的职位在内存中收集，步骤3直接合并
+        log_files = [h for h in logging.getLogger().handlers if isinstance(h, logging.FileHandler)]
+        step2_ok, collected_jobs = run_in_process(
+            "batch_scraper",
+            lambda: batch_scraper.BatchJobScraper(log_handlers=log_files).run_batch_scraping(
+                start_index=0, max_companies=end_index, delay_seconds=1, collect_jobs=True,
+                detail_bucket=job_scraper_improved.DETAIL_BUCKET),
+            logger
+        )
+    if step2_ok:
         success_count += 1
-        # 检查生成的文件
-        latest_jobs_file = get_latest_files("all_jobs_*.csv", logger)
-        if latest_jobs_file:
-            logger.info(f"✅ 成功生成jobs文件: {latest_jobs_file}")
+        # 检查生成的数据
+        if collected_jobs:
+            logger.info(f"✅ 成功爬取 {len(collected_jobs)} 条职位数据")
+        elif jobs_file:
+            logger.info(f"✅ 成功生成jobs文件: {jobs_file}")
         else:
-            logger.warning("⚠️ 未找到生成的jobs文件")
+            logger.warning("⚠️ 未找到爬取的jobs数据")
     else:
         logger.error("❌ 步骤2失败，但继续执行后续步骤")
     
     # 步骤3: 合并数据
     logger.info("\n🔗 步骤 3/3: 合并数据生成最终文件")
     logger.info("-" * 50)
-    if run_script("update_jobs_with_company_info_merged.py", logger):
+    if args.isolated:
+        step3_ok = run_script("update_jobs_with_company_info_merged.py", logger)
+        if step3_ok:
+            merged_file = get_latest_files("all_jobs_company_info_*.csv", logger)
+    elif collected_jobs and companies_df is not None:
+        def merge_collected_jobs():
+            # 列顺序与汇总CSV文件一致
+            jobs_df = pd.DataFrame(collected_jobs, columns=job_scraper_improved.YCombinatorJobScraper.CSV_FIELDNAMES)
+            merged_df = update_jobs_with_company_info_merged.merge_inmem(jobs_df, companies_df)
+            if merged_df is None:
+                return None
+            return update_jobs_with_company_info_merged.save_merged(merged_df, jobs_df)
+        step3_ok, merged_file = run_in_process("update_jobs_with_company_info_merged", merge_collected_jobs, logger)
+    else:
+        # 没有在内存中收集到职位时，合并已有的最新jobs文件；步骤2已读取的公司数据直接复用
+        step3_ok, merged_file = run_in_process(
+            "update_jobs_with_company_info_merged",
+            lambda: update_jobs_with_company_info_merged.update_jobs_with_company_info(companies_df),
+            logger
+        )
+    if not args.isolated:
+        step3_ok = step3_ok and merged_file is not None
+    if step3_ok:
         success_count += 1
         # 检查生成的文件
-        latest_merged_file = get_latest_files("all_jobs_company_info_*.csv", logger)
-        if latest_merged_file:
-            logger.info(f"✅ 成功生成最终合并文件: {latest_merged_file}")
+        if merged_file:
+            logger.info(f"✅ 成功生成最终合并文件: {merged_file}")
         else:
             logger.warning("⚠️ 未找到生成的合并文件")
     else:
@@ -294,16 +413,12 @@ def main():
         
         # 显示最终生成的文件
         logger.info("\n📁 生成的文件:")
-        latest_companies = get_latest_files("all_hiring_companies_*.csv", logger)
-        latest_jobs = get_latest_files("all_jobs_*.csv", logger) 
-        latest_merged = get_latest_files("all_jobs_company_info_*.csv", logger)
-        
-        if latest_companies:
-            logger.info(f"  - Companies文件: {latest_companies}")
-        if latest_jobs:
-            logger.info(f"  - Jobs文件: {latest_jobs}")
-        if latest_merged:
-            logger.info(f"  - 最终合并文件: {latest_merged}")
+        if companies_file:
+            logger.info(f"  - Companies文件: {companies_file}")
+        if jobs_file:
+            logger.info(f"  - Jobs文件: {jobs_file}")
+        if merged_file:
+            logger.info(f"  - 最终合并文件: {merged_file}")
             
         logger.info("\n✅ 完整流程执行成功！")
         return 0
@@ -0,0 +1,92 @@
+-- update_supabase_tables.py使用的数据库函数，在Supabase的SQL编辑器中执行一次即可
+-- 未创建时脚本会退回到逐行DELETE和PostgREST按行插入
+-- 函数以调用者的权限执行（security invoker），表的授权和RLS策略照常生效：
+-- 持有公开的anon密钥的人通过这些函数能做的，不会超过直接通过PostgREST对表所能做的
+
+-- 清空表：一次TRUNCATE代替逐行删除
+create or replace function truncate_table(tbl text) returns void
+language plpgsql security invoker set search_path = public as $$
+begin
+  if tbl not in ('hiring_companies', 'yc_jobs', 'yc_jobs_join') then
+    raise exception 'table % is not allowed', tbl;
+  end if;
+  execute format('truncate table %I restart identity', tbl);
+end $$;
+
+-- 按列批量插入：data为 {字段名: [各行的值]}，用unnest把各列数组组合成行后一条INSERT写入，
+-- 文本值按表中字段的类型转换；给出key时按该字段upsert，只更新内容有变化的行，
+-- 同一批中key重复的行只保留最后一行（否则ON CONFLICT DO UPDATE会因同一行被更新两次而报错）；返回写入的记录数
+drop function if exists bulk_insert(text, jsonb);
+create or replace function bulk_insert(tbl text, data jsonb, key text default null) returns integer
+language plpgsql security invoker set search_path = public as $$
+declare
+  column_list text;
+  select_list text;
+  array_list text;
+  conflict_clause text;
+  unknown_column text;
+  inserted integer;
+begin
+  if tbl not in ('hiring_companies', 'yc_jobs', 'yc_jobs_join') then
+    raise exception 'table % is not allowed', tbl;
+  end if;
+
+  select k into unknown_column
+    from jsonb_object_keys(data) as k
+   where not exists (select 1 from pg_attribute a
+                      where a.attrelid = tbl::regclass and a.attname = k
+                        and a.attnum > 0 and not a.attisdropped);
+  if unknown_column is not null then
+    raise exception 'column % does not exist in table %', unknown_column, tbl;
+  end if;
+
+  select string_agg(quote_ident(a.attname), ', ' order by a.attnum),
+         string_agg(format('u.%I::%s', a.attname, format_type(a.atttypid, a.atttypmod)), ', ' order by a.attnum),
+         string_agg(format('array(select e.v from jsonb_array_elements_text($1->%L) with ordinality as e(v, i) order by e.i)',
+                           a.attname), ', ' order by a.attnum)
+    into column_list, select_list, array_list
+    from pg_attribute a
+   where a.attrelid = tbl::regclass and a.attnum > 0 and not a.attisdropped and data ? a.attname;
+
+  if key is not null then
+    select format('on conflict (%I) do update set %s where (%s) is distinct from (%s)', key,
+                  string_agg(format('%I = excluded.%I', c, c), ', '),
+                  string_agg(format('%I.%I', tbl, c), ', '),
+                  string_agg(format('excluded.%I', c), ', '))
+      into conflict_clause
+      from jsonb_object_keys(data) as c
+     where c <> key
+    having count(*) > 0;
+    -- data中只有key字段时没有可更新的字段，已存在的行保持不变
+    conflict_clause := coalesce(conflict_clause, format('on conflict (%I) do nothing', key));
+  end if;
+
+  if key is null then
+    execute format('insert into %I (%s) select %s from unnest(%s) as u(%s)',
+                   tbl, column_list, select_list, array_list, column_list)
+      using data;
+  else
+    execute format('insert into %I (%s) select distinct on (u.%I) %s from unnest(%s) with ordinality as u(%s, row_number) '
+                   'order by u.%I, u.row_number desc %s',
+                   tbl, column_list, key, select_list, array_list, column_list, key, conflict_clause)
+      using data;
+  end if;
+  get diagnostics inserted = row_count;
+  return inserted;
+end $$;
+
+-- 删除key字段的值不在keys（本次上传的全部key）中的行，upsert之后用来清理已不存在的数据；返回删除的记录数
+create or replace function delete_missing(tbl text, key text, keys jsonb) returns integer
+language plpgsql security invoker set search_path = public as $$
+declare
+  deleted integer;
+begin
+  if tbl not in ('hiring_companies', 'yc_jobs', 'yc_jobs_join') then
+    raise exception 'table % is not allowed', tbl;
+  end if;
+  execute format('delete from %I t where not exists (select 1 from jsonb_array_elements_text($1) as k(v) where k.v = t.%I::text)',
+                 tbl, key)
+    using keys;
+  get diagnostics deleted = row_count;
+  return deleted;
+end $$;
@@ -8,9 +8,65 @@ Supabase连接测试脚本
 import os
 import sys
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+def probe_table(supabase, table_name):
+    """
+    测试单个表的查询权限和记录数
+    返回 (要打印的输出行, 测试结果)
+    """
+    lines = [f"\n📊 测试表: {table_name}"]
+    try:
+        # 测试查询权限 - 获取表结构信息
+        result = supabase.table(table_name).select("*").limit(1).execute()
+        
+        if result.data is not None:
+            lines.append(f"   ✅ 查询权限: 正常")
+            
+            # 获取准确的记录总数：head=True只返回Content-Range中的计数，不传输表中的数据；
+            # 旧版SDK的select不支持head参数时只取1行，计数仍然来自Content-Range
+            try:
+                try:
+                    count_query = supabase.table(table_name).select("*", count="exact", head=True)
+                except TypeError:
+                    count_query = supabase.table(table_name).select("*", count="exact").limit(1)
+                count_result = count_query.execute()
+                record_count = count_result.count if hasattr(count_result, 'count') else 0
+                lines.append(f"   📈 当前记录数: {record_count}")
+            except Exception as count_error:
+                lines.append(f"   ⚠️ 无法获取准确记录数: {str(count_error)}")
+                record_count = len(result.data)
+                lines.append(f"   📈 样本记录数: {record_count}")
+            
+            # 如果有数据，显示字段信息
+            if record_count > 0:
+                fields = list(result.data[0].keys())
+                lines.append(f"   🏷️ 字段数量: {len(fields)}")
+                lines.append(f"   📝 字段列表: {', '.join(fields[:10])}{'...' if len(fields) > 10 else ''}")
+            else:
+                lines.append(f"   📝 表为空，无法获取字段信息")
+            
+            return lines, {
+                'accessible': True,
+                'record_count': record_count,
+                'fields': list(result.data[0].keys()) if record_count > 0 else []
+            }
+        else:
+            lines.append(f"   ⚠️ 查询返回None")
+            return lines, {
+                'accessible': False,
+                'error': 'Query returned None'
+            }
+            
+    except Exception as e:
+        lines.append(f"   ❌ 访问失败: {str(e)}")
+        return lines, {
+            'accessible': False,
+            'error': str(e)
+        }
+
 def test_supabase_connection():
     """测试Supabase连接和表访问"""
     print("🔍 开始测试Supabase连接...")
@@ -46,54 +102,14 @@ def test_supabase_connection():
         print(f"\n🗄️ 测试表访问权限:")
         print("-" * 30)
         
-        table_results = {}
+        # 各表的查询相互独立，并发执行；每个表的输出先收集起来，按表的顺序打印
+        with ThreadPoolExecutor(max_workers=len(tables_to_test)) as executor:
+            probes = list(executor.map(lambda name: probe_table(supabase, name), tables_to_test))
         
-        for table_name in tables_to_test:
-            try:
-                print(f"\n📊 测试表: {table_name}")
-                
-                # 测试查询权限 - 获取表结构信息
-                result = supabase.table(table_name).select("*").limit(1).execute()
-                
-                if result.data is not None:
-                    print(f"   ✅ 查询权限: 正常")
-                    
-                    # 获取准确的记录总数
-                    try:
-                        count_result = supabase.table(table_name).select("*", count="exact").execute()
-                        record_count = count_result.count if hasattr(count_result, 'count') else 0
-                        print(f"   📈 当前记录数: {record_count}")
-                    except Exception as count_error:
-                        print(f"   ⚠️ 无法获取准确记录数: {str(count_error)}")
-                        record_count = len(result.data)
-                        print(f"   📈 样本记录数: {record_count}")
-                    
-                    # 如果有数据，显示字段信息
-                    if record_count > 0:
-                        fields = list(result.data[0].keys())
-                        print(f"   🏷️ 字段数量: {len(fields)}")
-                        print(f"   📝 字段列表: {', '.join(fields[:10])}{'...' if len(fields) > 10 else ''}")
-                    else:
-                        print(f"   📝 表为空，无法获取字段信息")
-                    
-                    table_results[table_name] = {
-                        'accessible': True,
-                        'record_count': record_count,
-                        'fields': list(result.data[0].keys()) if record_count > 0 else []
-                    }
-                else:
-                    print(f"   ⚠️ 查询返回None")
-                    table_results[table_name] = {
-                        'accessible': False,
-                        'error': 'Query returned None'
-                    }
-                    
-            except Exception as e:
-                print(f"   ❌ 访问失败: {str(e)}")
-                table_results[table_name] = {
-                    'accessible': False,
-                    'error': str(e)
-                }
+        table_results = {}
+        for table_name, (lines, info) in zip(tables_to_test, probes):
+            print("\n".join(lines))
+            table_results[table_name] = info
         
         # 测试插入权限（使用测试数据）
         print(f"\n🔧 测试写入权限:")
@@ -101,9 +117,10 @@ def test_supabase_connection():
         
         test_table = 'hiring_companies'  # 使用hiring_companies表进行写入测试
         try:
-            # 创建测试数据
+            # 创建测试数据，名称带时间戳，清理时按名称删除
+            test_name = f'TEST_COMPANY_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
             test_data = {
-                'name': f'TEST_COMPANY_{datetime.now().strftime("%Y%m%d_%H%M%S")}',
+                'name': test_name,
                 'slug': 'test-company',
                 'website': 'https://test.com',
                 'created_at': datetime.now().isoformat(),
@@ -112,24 +129,19 @@ def test_supabase_connection():
             
             print(f"📝 尝试插入测试数据到 {test_table} 表...")
             
-            # 插入测试数据
-            insert_result = supabase.table(test_table).insert(test_data).execute()
+            # 插入测试数据；returning='minimal'让服务器不回传插入的行，插入失败时会抛出异常
+            supabase.table(test_table).insert(test_data, returning='minimal').execute()
+            print(f"   ✅ 插入成功: {test_name}")
             
-            if insert_result.data:
-                inserted_id = insert_result.data[0].get('id')
-                print(f"   ✅ 插入成功，ID: {inserted_id}")
-                
-                # 立即删除测试数据
-                delete_result = supabase.table(test_table).delete().eq('id', inserted_id).execute()
-                if delete_result:
-                    print(f"   🗑️ 测试数据已清理")
-                else:
-                    print(f"   ⚠️ 测试数据清理可能失败")
-                    
-                print(f"   ✅ 写入权限: 正常")
+            # 立即删除测试数据，按唯一的测试名称删除，不需要先取回插入行的ID
+            delete_result = supabase.table(test_table).delete(returning='minimal').eq('name', test_name).execute()
+            if delete_result:
+                print(f"   🗑️ 测试数据已清理")
             else:
-                print(f"   ❌ 插入失败: 无返回数据")
+                print(f"   ⚠️ 测试数据清理可能失败")
                 
+            print(f"   ✅ 写入权限: 正常")
+            
         except Exception as e:
             print(f"   ❌ 写入测试失败: {str(e)}")
         
@@ -1,32 +1,123 @@
 import pandas as pd
 import os
-import glob
+import re
+import fnmatch
+import codecs
 from datetime import datetime
 
+try:
+    import pyarrow
+    import pyarrow.csv as pacsv
+except ImportError:  # 可选依赖，未安装时使用pandas默认的C解析器
+    pyarrow = None
+
+# 写CSV时每批格式化的行数，避免一次为整个DataFrame生成中间数据
+CSV_WRITE_CHUNKSIZE = 50_000
+# 分块关联jobs文件时每块读取的行数
+CSV_READ_CHUNKSIZE = 50_000
+
+# 数据文件名中的日期（和时间），如 all_jobs_20250825.csv、all_jobs_company_info_20250825_143000.csv
+FILE_DATE_PATTERN = re.compile(r'_(\d{8})(?:_(\d{6}))?\.\w+$')
+
+# 合并结果中不需要的公司字段，读取companies文件时直接跳过
+COMPANY_FIELDS_TO_REMOVE = ['isHiring', 'url', 'api']
+
+# 读取时使用的列类型：重复值多的文本列用category，公司id用可空的Int64（有空值时不会变成浮点数）
+# 只对另一个表中没有的列使用category，关联后用公司数据填充同名字段时不会因为类别不同而出错；
+# job_id在获取失败时是占位文本，保持默认类型
+JOBS_DTYPES = {'company': 'category'}
+COMPANIES_DTYPES = {'id': 'Int64', 'batch': 'category', 'status': 'category', 'stage': 'category',
+                    'industry': 'category', 'subindustry': 'category'}
+
+def keep_company_column(column):
+    """读取companies文件时是否保留该列（作为read_csv的usecols）"""
+    return column not in COMPANY_FIELDS_TO_REMOVE
+
+def csv_encodings(filepath):
+    """
+    返回读取CSV文件时依次尝试的编码（文件以UTF-8 BOM开头时直接按UTF-8读取）
+    """
+    with open(filepath, 'rb') as f:
+        has_utf8_bom = f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8
+    return ['utf-8-sig'] if has_utf8_bom else ['utf-8', 'gbk', 'latin-1']
+
+def read_csv_file(filepath, usecols=None, dtype=None):
+    """
+    读取CSV文件，依次尝试UTF-8、GBK、latin-1编码（文件以UTF-8 BOM开头时直接按UTF-8读取）
+    安装了pyarrow时直接用多线程的pyarrow.csv解析：pandas的pyarrow引擎不能开启newlines_in_values，
+    描述等字段的值中含有换行，文件较大、按块并行解析时会出错；可调用的usecols先读表头转换为列名列表
+    """
+    encodings = csv_encodings(filepath)
+    for i, encoding in enumerate(encodings):
+        try:
+            if pyarrow is None:
+                # 内存映射读取文件，整列一次推断类型
+                return pd.read_csv(filepath, encoding=encoding, usecols=usecols, dtype=dtype,
+                                   engine='c', memory_map=True, low_memory=False)
+            
+            columns = usecols
+            if callable(usecols):
+                header = pd.read_csv(filepath, encoding=encoding, nrows=0).columns
+                columns = [col for col in header if usecols(col)]
+            # 与pandas的pyarrow引擎一致：空字符串读为空值，全为空值的列读为float64
+            convert_options = pacsv.ConvertOptions(include_columns=columns or [], strings_can_be_null=True)
+            table = pacsv.read_csv(filepath, read_options=pacsv.ReadOptions(encoding=encoding),
+                                   parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                                   convert_options=convert_options)
+            schema = pyarrow.schema([field.with_type(pyarrow.float64()) if pyarrow.types.is_null(field.type) else field
+                                     for field in table.schema])
+            df = table.cast(schema).to_pandas()
+            if dtype:
+                df = df.astype({col: col_type for col, col_type in dtype.items() if col in df.columns})
+            # pyarrow不会因编码不符报错，而是把无法解码的列读成bytes，此时按解码失败处理
+            for col in df.columns:
+                first_index = df[col].first_valid_index()
+                if first_index is not None and isinstance(df[col][first_index], bytes):
+                    raise UnicodeDecodeError(encoding, b'', 0, 1, f"列'{col}'无法按{encoding}解码")
+            return df
+        except UnicodeDecodeError:
+            if i == len(encodings) - 1:
+                raise
+            print(f"{encoding.upper()}编码失败，尝试使用{encodings[i + 1].upper()}编码...")
+
+def file_date_key(name):
+    """按文件名中的日期和时间排序用的键，文件名中没有日期时返回None"""
+    match = FILE_DATE_PATTERN.search(name)
+    return None if match is None else match.group(1) + (match.group(2) or '000000')
+
 def find_latest_file(pattern):
     """找到匹配模式的最新文件"""
-    # 首先在result目录中查找
-    result_pattern = os.path.join("result", pattern)
-    result_files = glob.glob(result_pattern)
-    
-    # 然后在根目录中查找
-    root_files = glob.glob(pattern)
-    
-    # 合并所有文件
-    all_files = result_files + root_files
+    # 在result目录和根目录中查找，一次scandir读取整个目录
+    files = []
+    for directory in ("result", "."):
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+                    path = os.path.join(directory, entry.name) if directory != "." else entry.name
+                    files.append((path, entry))
     
-    if not all_files:
+    if not files:
         return None
     
-    # 按修改时间排序，返回最新的文件
-    latest_file = max(all_files, key=os.path.getmtime)
-    return latest_file
+    # 文件名中带日期时按日期取最新的文件，不必读取文件状态；都没有日期时按修改时间
+    dated = [(file_date_key(entry.name), path) for path, entry in files if file_date_key(entry.name)]
+    if dated:
+        return max(dated, key=lambda item: item[0])[1]
+    return max(files, key=lambda item: item[1].stat().st_mtime)[0]
 
-def update_jobs_with_company_info():
-    """根据company字段关联更新jobs文件"""
+def update_jobs_with_company_info(companies_df=None):
+    """
+    根据company字段关联更新jobs文件
+    companies_df: 调用方已经读取的公司数据（None表示读取最新的companies文件）
+    """
     
     # 找到最新的all_jobs_文件
-    jobs_pattern = "all_jobs_*.csv"
+    # all_jobs_后紧跟日期，不会匹配到合并结果all_jobs_company_info_*.csv
+    jobs_pattern = "all_jobs_[0-9]*.csv"
     latest_jobs_file = find_latest_file(jobs_pattern)
     
     if not latest_jobs_file:
@@ -34,194 +125,223 @@ def update_jobs_with_company_info():
         return
     
     # 找到最新的all_hiring_companies_文件
-    companies_pattern = "all_hiring_companies_*.csv"
-    latest_companies_file = find_latest_file(companies_pattern)
-    
-    if not latest_companies_file:
-        print("未找到all_hiring_companies_*.csv文件")
-        return
+    latest_companies_file = None
+    if companies_df is None:
+        companies_pattern = "all_hiring_companies_*.csv"
+        latest_companies_file = find_latest_file(companies_pattern)
+        
+        if not latest_companies_file:
+            print("未找到all_hiring_companies_*.csv文件")
+            return
     
     print(f"正在处理文件:")
     print(f"Jobs文件: {latest_jobs_file}")
-    print(f"Companies文件: {latest_companies_file}")
+    print(f"Companies文件: {latest_companies_file or '使用已读取的公司数据'}")
     
     try:
-        # 读取jobs文件 - 尝试不同的编码
-        print("正在读取jobs文件...")
-        try:
-            jobs_df = pd.read_csv(latest_jobs_file, encoding='utf-8')
-        except UnicodeDecodeError:
-            print("UTF-8编码失败，尝试使用GBK编码...")
-            try:
-                jobs_df = pd.read_csv(latest_jobs_file, encoding='gbk')
-            except UnicodeDecodeError:
-                print("GBK编码失败，尝试使用latin-1编码...")
-                jobs_df = pd.read_csv(latest_jobs_file, encoding='latin-1')
-        print(f"Jobs文件包含 {len(jobs_df)} 条记录")
-        
         # 读取companies文件 - 尝试不同的编码
-        print("正在读取companies文件...")
-        try:
-            companies_df = pd.read_csv(latest_companies_file, encoding='utf-8')
-        except UnicodeDecodeError:
-            print("UTF-8编码失败，尝试使用GBK编码...")
-            try:
-                companies_df = pd.read_csv(latest_companies_file, encoding='gbk')
-            except UnicodeDecodeError:
-                print("GBK编码失败，尝试使用latin-1编码...")
-                companies_df = pd.read_csv(latest_companies_file, encoding='latin-1')
+        if companies_df is None:
+            print("正在读取companies文件...")
+            companies_df = read_csv_file(latest_companies_file, usecols=keep_company_column, dtype=COMPANIES_DTYPES)
         print(f"Companies文件包含 {len(companies_df)} 条记录")
         
-        # 显示两个文件的列名
-        print(f"\nJobs文件列名: {list(jobs_df.columns)}")
-        print(f"Companies文件列名: {list(companies_df.columns)}")
-        
-        # 检查company字段是否存在
-        if 'company' not in jobs_df.columns:
-            print("错误: jobs文件中没有找到'company'字段")
-            return
-        
-        # 假设companies文件中也有company字段或类似的字段
-        company_col_in_companies = None
-        possible_company_cols = ['company', 'name', 'company_name', 'Company', 'Name']
-        
-        for col in possible_company_cols:
-            if col in companies_df.columns:
-                company_col_in_companies = col
-                break
-        
-        if not company_col_in_companies:
-            print("错误: companies文件中没有找到公司名称字段")
-            print(f"可用字段: {list(companies_df.columns)}")
-            return
-        
-        print(f"使用companies文件中的'{company_col_in_companies}'字段进行匹配")
-        
-        # 备份原始jobs文件
-        backup_file = latest_jobs_file.replace('.csv', '_backup.csv')
-        jobs_df.to_csv(backup_file, index=False)
-        print(f"已创建备份文件: {backup_file}")
-        
-        # 执行左连接，保留所有jobs记录
-        print("正在执行数据关联...")
-        merged_df = jobs_df.merge(
-            companies_df, 
-            left_on='company', 
-            right_on=company_col_in_companies, 
-            how='left',
-            suffixes=('', '_company')
-        )
-        
-        # 将id字段重命名为company_id
-        if 'id' in merged_df.columns:
-            merged_df = merged_df.rename(columns={'id': 'company_id'})
-            print("已将'id'字段重命名为'company_id'")
-        
-        print(f"关联后包含 {len(merged_df)} 条记录")
-        
-        # 统计匹配情况
-        matched_count = merged_df[company_col_in_companies].notna().sum()
-        unmatched_count = len(merged_df) - matched_count
-        
-        print(f"匹配成功: {matched_count} 条记录")
-        print(f"未匹配: {unmatched_count} 条记录")
-        
-        # 如果有重复的列名，处理冲突
-        duplicate_cols = []
-        current_columns = set(merged_df.columns)
-        
-        for col in merged_df.columns:
-            if col.endswith('_company'):
-                original_col = col[:-8]
-                # 检查原始列是否存在（排除已重命名的id字段）
-                if original_col in jobs_df.columns or (original_col == 'id' and 'company_id' in current_columns):
-                    duplicate_cols.append(col)
-        
-        if duplicate_cols:
-            print(f"发现重复字段: {duplicate_cols}")
-            print("将使用companies文件中的数据覆盖jobs文件中的对应字段")
-            
-            for col in duplicate_cols:
-                original_col = col[:-8]
-                
-                # 特殊处理id字段，因为已经重命名为company_id
-                if original_col == 'id':
-                    # 删除重复的id_company列，因为我们已经有company_id了
-                    merged_df = merged_df.drop(columns=[col])
-                    continue
-                
-                # 检查原始列是否存在
-                if original_col in merged_df.columns:
-                    # 用companies文件的数据填充空值或覆盖原有数据
-                    merged_df[original_col] = merged_df[col].fillna(merged_df[original_col])
-                
-                # 删除重复列
-                merged_df = merged_df.drop(columns=[col])
-        
-        # 移除不需要的name字段（因为已经有company字段了）
-        if 'name' in merged_df.columns:
-            merged_df = merged_df.drop(columns=['name'])
-            print("已移除重复的'name'字段")
-        
-        # 检查并移除重复的company_id字段
-        if merged_df.columns.tolist().count('company_id') > 1:
-            # 保留第一个company_id，移除重复的
-            cols = merged_df.columns.tolist()
-            first_company_id_idx = cols.index('company_id')
-            duplicate_indices = [i for i, col in enumerate(cols) if col == 'company_id' and i != first_company_id_idx]
-            
-            for idx in sorted(duplicate_indices, reverse=True):
-                merged_df = merged_df.drop(columns=[cols[idx]])
-            print("已移除重复的'company_id'字段")
-        
-        # 处理可能的company_id.1等重命名问题
-        if 'company_id.1' in merged_df.columns:
-            merged_df = merged_df.rename(columns={'company_id.1': 'company_id'})
-            print("已将'company_id.1'重命名为'company_id'")
-        
-        # 移除不需要的字段
-        fields_to_remove = ['isHiring', 'url', 'api']
-        removed_fields = []
-        for field in fields_to_remove:
-            if field in merged_df.columns:
-                merged_df = merged_df.drop(columns=[field])
-                removed_fields.append(field)
-        
-        if removed_fields:
-            print(f"已移除字段: {removed_fields}")
-        
-        # 确保result目录存在
-        result_dir = "result"
-        if not os.path.exists(result_dir):
-            os.makedirs(result_dir)
-        
-        # 生成带日期和时间的输出文件名，避免文件冲突
-        current_datetime = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f"all_jobs_company_info_{current_datetime}.csv"
-        output_file = os.path.join(result_dir, output_filename)
-        
-        # 保存最终文件
-        merged_df.to_csv(output_file, index=False)
-        
-        print(f"已保存最终文件: {output_file}")
-        
-        # 显示新增的字段
-        new_columns = set(merged_df.columns) - set(jobs_df.columns)
-        if new_columns:
-            print(f"新增字段: {list(new_columns)}")
-        
-        # 显示一些统计信息
-        print(f"\n更新后文件统计:")
-        print(f"总记录数: {len(merged_df)}")
-        print(f"总字段数: {len(merged_df.columns)}")
-        print(f"字段列表: {list(merged_df.columns)}")
-        
+        # 分块读取jobs文件并逐块关联写出，内存占用不随jobs文件增长
+        print("正在分块读取并关联jobs文件...")
+        output_file = new_output_file()
+        stats = merge_jobs_file(latest_jobs_file, companies_df, output_file,
+                                backup_file=latest_jobs_file.replace('.csv', '_backup.csv'))
+        if stats is None:
+            return None
+        jobs_count, jobs_columns, merged_count, merged_columns = stats
+        print(f"Jobs文件包含 {jobs_count} 条记录")
+        print_output_summary(output_file, jobs_columns, merged_count, merged_columns)
         return output_file
         
     except Exception as e:
         print(f"处理过程中出现错误: {str(e)}")
         return None
 
+def merge_jobs_file(jobs_file, companies_df, output_file, backup_file=None):
+    """
+    分块读取jobs文件，逐块关联公司信息后追加写入输出文件，依次尝试不同的编码
+    返回 (jobs记录数, jobs字段, 关联后记录数, 关联后字段)，字段缺失时返回None
+    """
+    encodings = csv_encodings(jobs_file)
+    for i, encoding in enumerate(encodings):
+        try:
+            return merge_jobs_chunks(jobs_file, encoding, companies_df, output_file, backup_file)
+        except UnicodeDecodeError:
+            if i == len(encodings) - 1:
+                raise
+            # 已写出的部分会在用下一种编码重新读取时被覆盖
+            print(f"{encoding.upper()}编码失败，尝试使用{encodings[i + 1].upper()}编码...")
+
+def merge_jobs_chunks(jobs_file, encoding, companies_df, output_file, backup_file=None):
+    """
+    按指定编码分块读取jobs文件并关联，第一块覆盖写入输出文件和备份文件，之后的块追加写入
+    """
+    jobs_count = 0
+    merged_count = 0
+    jobs_columns = []
+    merged_columns = []
+    with pd.read_csv(jobs_file, encoding=encoding, dtype=JOBS_DTYPES, chunksize=CSV_READ_CHUNKSIZE,
+                     memory_map=True) as reader:
+        for chunk_index, chunk in enumerate(reader):
+            first_chunk = chunk_index == 0
+            # 只有第一块输出关联过程的详细信息，其余各块的字段处理相同
+            merged_chunk = merge_inmem(chunk, companies_df, verbose=first_chunk)
+            if merged_chunk is None:
+                return None
+            
+            mode = 'w' if first_chunk else 'a'
+            if backup_file:
+                chunk.to_csv(backup_file, mode=mode, header=first_chunk, index=False)
+            merged_chunk.to_csv(output_file, mode=mode, header=first_chunk, index=False)
+            
+            jobs_count += len(chunk)
+            merged_count += len(merged_chunk)
+            jobs_columns = list(chunk.columns)
+            merged_columns = list(merged_chunk.columns)
+    
+    if backup_file and jobs_count:
+        print(f"已创建备份文件: {backup_file}")
+    return jobs_count, jobs_columns, merged_count, merged_columns
+
+def merge_inmem(jobs_df, companies_df, backup_file=None, verbose=True):
+    """
+    在内存中把公司信息关联到职位数据，返回合并后的DataFrame（字段缺失时返回None）
+    run_complete_scraper可以直接传入批量爬取得到的职位数据，不必先写出再读回CSV文件
+    backup_file: 合并前备份职位数据的文件路径（None表示不备份）
+    verbose: 是否输出关联过程的详细信息（错误信息总是输出）
+    """
+    log = print if verbose else (lambda *args: None)
+    # 显示两个文件的列名
+    log(f"\nJobs文件列名: {list(jobs_df.columns)}")
+    log(f"Companies文件列名: {list(companies_df.columns)}")
+    
+    # 检查company字段是否存在
+    if 'company' not in jobs_df.columns:
+        print("错误: jobs文件中没有找到'company'字段")
+        return
+    
+    # 假设companies文件中也有company字段或类似的字段
+    company_col_in_companies = None
+    possible_company_cols = ['company', 'name', 'company_name', 'Company', 'Name']
+    
+    for col in possible_company_cols:
+        if col in companies_df.columns:
+            company_col_in_companies = col
+            break
+    
+    if not company_col_in_companies:
+        print("错误: companies文件中没有找到公司名称字段")
+        print(f"可用字段: {list(companies_df.columns)}")
+        return
+    
+    log(f"使用companies文件中的'{company_col_in_companies}'字段进行匹配")
+    
+    # 备份原始jobs文件
+    if backup_file:
+        jobs_df.to_csv(backup_file, index=False, chunksize=CSV_WRITE_CHUNKSIZE)
+        log(f"已创建备份文件: {backup_file}")
+    
+    # 关联前先整理公司表：去掉不需要的字段，把id重命名为company_id，
+    # 这样关联结果中不会出现重复的id/company_id列，也不必再逐列清理
+    removed_fields = [field for field in COMPANY_FIELDS_TO_REMOVE if field in companies_df.columns]
+    companies_df = companies_df.drop(columns=removed_fields)
+    if 'id' in companies_df.columns:
+        companies_df = companies_df.rename(columns={'id': 'company_id'})
+        log("已将'id'字段重命名为'company_id'")
+    
+    # 执行左连接，保留所有jobs记录
+    log("正在执行数据关联...")
+    merged_df = jobs_df.merge(
+        companies_df, 
+        left_on='company', 
+        right_on=company_col_in_companies, 
+        how='left',
+        suffixes=('', '_company')
+    )
+    
+    log(f"关联后包含 {len(merged_df)} 条记录")
+    
+    # 统计匹配情况
+    matched_count = merged_df[company_col_in_companies].notna().sum()
+    unmatched_count = len(merged_df) - matched_count
+    
+    log(f"匹配成功: {matched_count} 条记录")
+    log(f"未匹配: {unmatched_count} 条记录")
+    
+    # 两个表都有的字段，用companies文件中的数据覆盖jobs文件中的对应字段
+    duplicate_cols = [col for col in merged_df.columns
+                      if col.endswith('_company') and col[:-8] in jobs_df.columns]
+    
+    if duplicate_cols:
+        log(f"发现重复字段: {duplicate_cols}")
+        log("将使用companies文件中的数据覆盖jobs文件中的对应字段")
+        
+        for col in duplicate_cols:
+            original_col = col[:-8]
+            # 用companies文件的数据填充空值或覆盖原有数据
+            merged_df[original_col] = merged_df[col].fillna(merged_df[original_col])
+    
+    # 需要移除的列收集起来一次删除：重复字段、name字段（因为已经有company字段了）、jobs文件中的同名无用字段
+    has_name = 'name' in merged_df.columns
+    jobs_fields = [field for field in COMPANY_FIELDS_TO_REMOVE if field in merged_df.columns]
+    to_drop = duplicate_cols + (['name'] if has_name else []) + jobs_fields
+    if to_drop:
+        merged_df = merged_df.drop(columns=to_drop)
+    
+    if has_name:
+        log("已移除重复的'name'字段")
+    
+    removed_fields = list(dict.fromkeys(removed_fields + jobs_fields))
+    if removed_fields:
+        log(f"已移除字段: {removed_fields}")
+    
+    return merged_df
+
+def new_output_file():
+    """
+    生成带日期和时间的输出文件路径，避免文件冲突
+    """
+    # 确保result目录存在
+    result_dir = "result"
+    os.makedirs(result_dir, exist_ok=True)
+    
+    current_datetime = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_filename = f"all_jobs_company_info_{current_datetime}.csv"
+    return os.path.join(result_dir, output_filename)
+
+def print_output_summary(output_file, jobs_columns, merged_count, merged_columns):
+    """
+    输出保存结果和更新后文件的统计信息
+    """
+    print(f"已保存最终文件: {output_file}")
+    
+    # 显示新增的字段
+    new_columns = set(merged_columns) - set(jobs_columns)
+    if new_columns:
+        print(f"新增字段: {list(new_columns)}")
+    
+    # 显示一些统计信息
+    print(f"\n更新后文件统计:")
+    print(f"总记录数: {merged_count}")
+    print(f"总字段数: {len(merged_columns)}")
+    print(f"字段列表: {merged_columns}")
+
+def save_merged(merged_df, jobs_df):
+    """
+    保存合并后的数据到带日期时间的CSV文件，返回文件路径
+    """
+    output_file = new_output_file()
+    
+    # 保存最终文件
+    merged_df.to_csv(output_file, index=False, chunksize=CSV_WRITE_CHUNKSIZE)
+    
+    print_output_summary(output_file, list(jobs_df.columns), len(merged_df), list(merged_df.columns))
+    return output_file
+
 if __name__ == "__main__":
     print("开始更新jobs文件...")
     result = update_jobs_with_company_info()
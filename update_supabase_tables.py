@@ -7,15 +7,159 @@
 """
 
 import os
+import io
+import re
+import csv
 import sys
-import glob
-import pandas as pd
+import gzip
+import fnmatch
 import json
+import itertools
+import functools
+import threading
 from datetime import datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import logging
+import logging.handlers
+from contextlib import contextmanager
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
 
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:  # 可选依赖，未安装时通过PostgREST分批插入
+    psycopg2 = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # 可选依赖，未安装时用标准库csv模块读取CSV
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时用标准库json序列化请求体
+    orjson = None
+
+# 清空表、按列批量插入和清理已删除数据时调用的数据库函数，需要先在Supabase的SQL编辑器中执行supabase_functions.sql创建
+# 未创建时退回到逐行DELETE和PostgREST按行插入
+TRUNCATE_RPC = 'truncate_table'
+BULK_INSERT_RPC = 'bulk_insert'
+DELETE_MISSING_RPC = 'delete_missing'
+
+# PostgREST分批插入时每批的最大记录数和请求体的最大字节数
+BATCH_SIZE = 5000
+MAX_PAYLOAD_BYTES = 4 * 1024 * 1024
+# 调用数据库函数时请求体超过该大小则用gzip压缩后发送，服务端不接受压缩的请求体时自动改为不压缩
+GZIP_MIN_BYTES = 16 * 1024
+# 未创建delete_missing函数时，按key删除的每个请求最多包含的key数，以及分页读取表中key时每页的行数，避免URL过长
+DELETE_BATCH_SIZE = 500
+KEY_PAGE_SIZE = 1000
+# 通过PostgREST更新时所有表共用的插入线程数，即同时发送的插入请求数，不超过Supabase连接池的大小；
+# 各表的清空、统计和删除请求在各表自己的线程中发送，最多再多出len(TABLES)个并发请求
+INSERT_WORKERS = 4
+# 取值重复度高的字段（地点、行业、状态、批次等），读取时按字典编码，相同的取值共用同一个字符串对象，
+# 排队等待发送的批次和记录不再各自保存一份重复的文本
+CATEGORY_COLUMNS = frozenset([
+    'company', 'company_id', 'location', 'jobType', 'visa', 'minExperience', 'minSchoolYear',
+    'is_remote', 'team_size', 'industry', 'subindustry', 'industries', 'regions', 'status',
+    'stage', 'batch', 'top_company', 'nonprofit', 'isHiring',
+])
+
+# 数据文件名中的日期（和时间），如 all_jobs_20250825.csv、all_jobs_company_info_20250825_143000.csv
+FILE_DATE_PATTERN = re.compile(r'_(\d{8})(?:_(\d{6}))?\.\w+$')
+
+# 要更新的表：(表名, 数据文件的匹配模式, 数据说明, upsert使用的唯一字段)
+# 有唯一字段（表中需有对应的主键或唯一约束）的表按该字段upsert并删除文件中已不存在的行，更新期间表不会为空；
+# 其余的表（职位数据没有可靠的唯一字段）清空后重新插入
+TABLES = [
+    ('hiring_companies', 'all_hiring_companies_*.csv', '公司数据', 'id'),
+    ('yc_jobs', 'all_jobs_[0-9]*.csv', '职位数据', None),
+    ('yc_jobs_join', 'all_jobs_company_info_*.csv', '合并数据', None),
+]
+
+def shared_values(array):
+    """
+    把pyarrow的一列字符串先做字典编码再转换为Python列表，相同的取值共用同一个字符串对象
+    """
+    encoded = array.dictionary_encode()
+    dictionary = encoded.dictionary.to_pylist()
+    return [None if i is None else dictionary[i] for i in encoded.indices.to_pylist()]
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """
+    加载.env中的环境变量，同一进程中只读取一次
+    """
+    load_dotenv()
+
+@functools.lru_cache(maxsize=None)
+def get_supabase_client(url, key):
+    """
+    创建Supabase客户端，同一进程中相同的地址和密钥共用一个客户端
+    客户端内部的HTTP/2会话保持连接，多次更新时不必重新建立连接和TLS握手
+    """
+    return create_client(url, key)
+
+def file_date_key(name):
+    """
+    按文件名中的日期和时间排序用的键，文件名中没有日期时返回None
+    """
+    match = FILE_DATE_PATTERN.search(name)
+    return None if match is None else match.group(1) + (match.group(2) or '000000')
+
+def encode_json(data):
+    """
+    把数据编码为JSON字节串，安装了orjson时用orjson编码
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, default=str, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def read_csv_header(filepath):
+    """
+    读取CSV文件的表头（字段列表）
+    """
+    with open(filepath, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+class CSVRowStream:
+    """
+    把记录逐批格式化为CSV文本的只读文件对象，供COPY ... FROM STDIN按需读取，不必先生成整个文件
+    """
+    
+    def __init__(self, columns, records):
+        self.rows = ([record[col] for col in columns] for record in records)
+        self.count = 0
+        # 已格式化的文本和其中已读出部分的长度；读取时只移动位置，不复制剩余的文本
+        self.pending = ''
+        self.offset = 0
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+    
+    def read(self, size=-1):
+        available = len(self.pending) - self.offset
+        while size < 0 or available < size:
+            rows = list(itertools.islice(self.rows, 1000))
+            if not rows:
+                break
+            self.writer.writerows(rows)
+            self.count += len(rows)
+            # 补充数据时丢掉已读出的部分，只有不足一次读取量的剩余文本被复制
+            self.pending = self.pending[self.offset:] + self.buffer.getvalue()
+            self.offset = 0
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            available = len(self.pending)
+        if size < 0:
+            size = available
+        data = self.pending[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
 class SupabaseUpdater:
     """
     Supabase数据库更新器
@@ -23,20 +167,41 @@ class SupabaseUpdater:
     
     def __init__(self):
         # 加载环境变量
-        load_dotenv()
+        load_env()
         
         # 获取Supabase配置
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
+        # 数据库直连地址（Supabase连接池的事务模式，如 postgresql://...pooler.supabase.com:6543/postgres）
+        # 配置后用COPY批量导入数据，否则通过PostgREST分批插入
+        self.database_url = os.getenv('SUPABASE_DB_URL')
         self.supabase: Client = None
+        self.db_conn = None
+        # result目录和根目录中的文件列表 [(路径, 目录项)]，三个表共用一次扫描结果
+        self.candidate_files = None
+        # truncate_table函数是否可用（None表示尚未尝试）
+        self.truncate_rpc_available = None
+        # bulk_insert函数是否可用（None表示尚未尝试）
+        self.bulk_insert_rpc_available = None
+        # 服务端是否接受gzip压缩的请求体（None表示尚未尝试）
+        self.gzip_available = None
+        # 以上三个标志由各表的更新线程和插入线程共同修改，修改时持有该锁
+        self.flags_lock = threading.Lock()
+        # 通过PostgREST更新时所有表共用的插入线程池（run_update中创建）
+        self.insert_executor = None
         
-        # 设置日志
+        # 设置日志：文件日志先缓存在内存中，攒够一批或遇到错误时再写入，程序退出时写出剩余部分
         os.makedirs('logs', exist_ok=True)
+        log_format = '%(asctime)s - %(levelname)s - %(message)s'
+        file_handler = logging.FileHandler(
+            f'logs/supabase_update_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log', delay=True)
+        # MemoryHandler转交的记录由目标处理器格式化，需要单独设置格式
+        file_handler.setFormatter(logging.Formatter(log_format))
         logging.basicConfig(
             level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
+            format=log_format,
             handlers=[
-                logging.FileHandler(f'logs/supabase_update_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
+                logging.handlers.MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler),
                 logging.StreamHandler(sys.stdout)
             ]
         )
@@ -51,38 +216,100 @@ class SupabaseUpdater:
                 raise ValueError("Supabase配置不完整，请检查.env文件")
             
             self.logger.info("正在连接到Supabase数据库...")
-            self.supabase = create_client(self.supabase_url, self.supabase_key)
+            self.supabase = get_supabase_client(self.supabase_url, self.supabase_key)
             
             # 测试连接
             test_result = self.supabase.table('hiring_companies').select("*").limit(1).execute()
             if test_result.data is not None:
                 self.logger.info("✅ Supabase数据库连接成功")
-                return True
             else:
                 raise Exception("连接测试失败")
                 
         except Exception as e:
             self.logger.error(f"❌ 数据库连接失败: {str(e)}")
             return False
+        
+        self.connect_postgres()
+        return True
+    
+    def connect_postgres(self):
+        """
+        配置了SUPABASE_DB_URL时建立一个Postgres连接，用于在一个事务中TRUNCATE并COPY导入所有表
+        所有表在同一个事务中依次导入，只需要一个连接，不使用连接池
+        连接池的5432端口（会话模式）会在更新期间独占一个服务端连接，不使用该地址，继续使用PostgREST；
+        连接失败时同样记录警告，继续使用PostgREST
+        """
+        if not self.database_url:
+            return
+        if psycopg2 is None:
+            self.logger.warning("已配置SUPABASE_DB_URL但未安装psycopg2，将通过PostgREST插入数据")
+            return
+        address = urlsplit(self.database_url)
+        if address.port == 5432 and 'pooler.' in (address.hostname or ''):
+            self.logger.warning("SUPABASE_DB_URL是连接池的5432端口（会话模式），请改用6543端口（事务模式）；"
+                                "本次将通过PostgREST插入数据")
+            return
+        try:
+            self.db_conn = psycopg2.connect(self.database_url)
+            self.logger.info("✅ Postgres直连成功，将使用COPY导入数据")
+        except Exception as e:
+            self.logger.warning(f"Postgres直连失败，将通过PostgREST插入数据: {str(e)}")
+            self.db_conn = None
+    
+    @contextmanager
+    def db_connection(self):
+        """
+        在Postgres连接上执行一个事务：正常结束时提交，出错时回滚
+        """
+        with self.db_conn:
+            yield self.db_conn
+    
+    def close_postgres(self):
+        """
+        关闭Postgres连接
+        """
+        if self.db_conn is not None:
+            self.db_conn.close()
+            self.db_conn = None
+    
+    def list_candidate_files(self):
+        """
+        扫描result目录和根目录（向后兼容）中的文件，结果缓存后供各表查找使用
+        """
+        if self.candidate_files is None:
+            self.candidate_files = []
+            for directory in ("result", "."):
+                try:
+                    entries = os.scandir(directory)
+                except FileNotFoundError:
+                    continue
+                with entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            path = os.path.join(directory, entry.name) if directory != "." else entry.name
+                            self.candidate_files.append((path, entry))
+        return self.candidate_files
     
     def find_latest_file(self, pattern):
         """
         查找最新的文件
         """
         try:
-            # 首先在result目录中查找
-            result_files = glob.glob(f"result/{pattern}")
-            # 然后在根目录中查找（向后兼容）
-            root_files = glob.glob(pattern)
-            
-            all_files = result_files + root_files
+            files = [(path, entry) for path, entry in self.list_candidate_files()
+                     if fnmatch.fnmatch(entry.name, pattern)]
+            # 文件名中带日期时按日期取最新的文件，不必读取文件状态；都没有日期时按修改时间
+            dated = [(file_date_key(entry.name), path) for path, entry in files if file_date_key(entry.name)]
+            if dated:
+                latest_file = max(dated, key=lambda item: item[0])[1]
+            elif files:
+                latest_file = max(files, key=lambda item: item[1].stat().st_mtime)[0]
+            else:
+                latest_file = None
             
-            if not all_files:
+            if not latest_file:
                 self.logger.warning(f"未找到匹配模式 {pattern} 的文件")
                 return None
             
-            # 按修改时间排序，返回最新的文件
-            latest_file = max(all_files, key=os.path.getmtime)
             self.logger.info(f"找到最新文件: {latest_file}")
             return latest_file
             
@@ -90,17 +317,111 @@ class SupabaseUpdater:
             self.logger.error(f"查找文件时出错: {str(e)}")
             return None
     
+    def read_csv_records(self, filepath):
+        """
+        读取CSV文件，返回 (字段列表, 逐条生成字典记录的迭代器)
+        按块流式读取，内存占用不随文件大小增长；所有字段按原始文本读取，空值为空字符串，
+        各块的字段类型不会因推断结果不同而不一致（数据库按字段类型解析文本）
+        安装了pyarrow时用pyarrow的流式解析器，否则用标准库csv模块逐行读取
+        """
+        columns = read_csv_header(filepath)
+        if pa is None:
+            return columns, self.iter_csv_records(filepath, columns)
+        return columns, self.iter_arrow_records(filepath, columns)
+    
+    @staticmethod
+    def iter_csv_records(filepath, columns):
+        """
+        用标准库csv模块逐行读取CSV文件并生成字典记录，不依赖pandas
+        字段不足的行用空字符串补齐，空行跳过；CATEGORY_COLUMNS中的字段相同的取值共用同一个字符串对象
+        """
+        shared = {col: {} for col in CATEGORY_COLUMNS.intersection(columns)}
+        width = len(columns)
+        with open(filepath, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < width:
+                    row += [''] * (width - len(row))
+                record = dict(zip(columns, row))
+                for col, values in shared.items():
+                    value = record[col]
+                    record[col] = values.setdefault(value, value)
+                yield record
+    
+    @staticmethod
+    def iter_arrow_records(filepath, columns):
+        """
+        用pyarrow的流式解析器按块读取CSV文件并逐条生成字典记录
+        """
+        convert_options = pacsv.ConvertOptions(column_types={col: pa.string() for col in columns})
+        # 描述等字段的值中含有换行，需要开启newlines_in_values，否则文件较大、按块并行解析时会出错
+        reader = pacsv.open_csv(filepath, read_options=pacsv.ReadOptions(use_threads=True),
+                                parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                                convert_options=convert_options)
+        for batch in reader:
+            records = batch.to_pylist()
+            for name in CATEGORY_COLUMNS.intersection(batch.schema.names):
+                for record, value in zip(records, shared_values(batch.column(name))):
+                    record[name] = value
+            yield from records
+    
     def get_table_record_count(self, table_name):
         """
         获取表的记录数量
+        head=True只返回Content-Range中的计数，不传输表中的数据；旧版SDK不支持head参数时只取1行
         """
         try:
-            result = self.supabase.table(table_name).select("*", count="exact").execute()
+            try:
+                query = self.supabase.table(table_name).select("*", count="exact", head=True)
+            except TypeError:
+                query = self.supabase.table(table_name).select("*", count="exact").limit(1)
+            result = query.execute()
             return result.count if hasattr(result, 'count') else 0
         except Exception as e:
             self.logger.warning(f"无法获取表 {table_name} 的记录数: {str(e)}")
             return 0
     
+    def set_flag(self, name, value):
+        """
+        在锁内设置可用性标志，返回设置前的值（为None时说明是第一次得出结论，调用方据此只输出一次提示）
+        """
+        with self.flags_lock:
+            previous = getattr(self, name)
+            setattr(self, name, value)
+            return previous
+    
+    @contextmanager
+    def insert_pool(self):
+        """
+        发送插入请求的线程池：run_update中各表共用同一个，总并发不超过INSERT_WORKERS；单独调用时临时创建
+        """
+        if self.insert_executor is not None:
+            yield self.insert_executor
+            return
+        with ThreadPoolExecutor(max_workers=INSERT_WORKERS) as executor:
+            yield executor
+    
+    def truncate_table(self, table_name):
+        """
+        通过truncate_table数据库函数清空表，一次TRUNCATE代替逐行删除
+        函数未创建时返回False，之后的表不再尝试
+        """
+        if self.truncate_rpc_available is False:
+            return False
+        try:
+            self.supabase.rpc(TRUNCATE_RPC, {'tbl': table_name}).execute()
+            self.set_flag('truncate_rpc_available', True)
+            return True
+        except Exception as e:
+            if self.truncate_rpc_available:
+                raise
+            if self.set_flag('truncate_rpc_available', False) is None:
+                self.logger.warning(f"无法调用 {TRUNCATE_RPC} 函数，改用DELETE清空表: {str(e)}")
+            return False
+    
     def clear_table(self, table_name):
         """
         清空表数据
@@ -108,193 +429,394 @@ class SupabaseUpdater:
         try:
             self.logger.info(f"正在清空表 {table_name}...")
             
-            # 获取当前记录数
-            current_count = self.get_table_record_count(table_name)
-            self.logger.info(f"表 {table_name} 当前有 {current_count} 条记录")
-            
-            if current_count == 0:
-                self.logger.info(f"表 {table_name} 已经为空，跳过清空操作")
-                return True
-            
-            # 删除所有记录 - 使用neq来删除所有记录
-            result = self.supabase.table(table_name).delete().neq('id', 0).execute()
+            if not self.truncate_table(table_name):
+                # 删除所有记录 - 使用neq来删除所有记录
+                self.supabase.table(table_name).delete(returning='minimal').neq('id', 0).execute()
             
-            # 验证删除结果
-            new_count = self.get_table_record_count(table_name)
-            self.logger.info(f"✅ 表 {table_name} 清空完成，剩余记录: {new_count}")
+            self.logger.info(f"✅ 表 {table_name} 清空完成")
             return True
             
         except Exception as e:
             self.logger.error(f"❌ 清空表 {table_name} 失败: {str(e)}")
             return False
     
-    def batch_insert_data(self, table_name, data, batch_size=100):
+    @staticmethod
+    def merge_sql(table_name, staging_name, columns, key):
+        """
+        生成把临时表中的数据合并到目标表的SQL：按key字段upsert（只更新内容有变化的行），
+        再删除临时表中不存在的行
+        """
+        target = sql.Identifier(table_name)
+        staging = sql.Identifier(staging_name)
+        key_column = sql.Identifier(key)
+        updates = [col for col in columns if col != key]
+        upsert_sql = sql.SQL(
+            "INSERT INTO {target} ({columns}) SELECT DISTINCT ON ({key}) {columns} FROM {staging} "
+            "ON CONFLICT ({key}) DO UPDATE SET {assignments} WHERE ({current}) IS DISTINCT FROM ({incoming})"
+        ).format(
+            target=target, staging=staging, key=key_column,
+            columns=sql.SQL(', ').join(sql.Identifier(col) for col in columns),
+            assignments=sql.SQL(', ').join(sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(col)) for col in updates),
+            current=sql.SQL(', ').join(sql.Identifier(table_name, col) for col in updates),
+            incoming=sql.SQL(', ').join(sql.SQL("EXCLUDED.{}").format(sql.Identifier(col)) for col in updates))
+        delete_sql = sql.SQL(
+            "DELETE FROM {target} t WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key})"
+        ).format(target=target, staging=staging, key=key_column)
+        return upsert_sql, delete_sql
+    
+    def copy_table(self, cur, table_name, columns, records, key=None):
+        """
+        在当前事务中通过COPY ... FROM STDIN导入一个表，返回导入的记录数，出错时抛出异常
+        省去逐批的HTTP请求和JSON解析；所有字段按非NULL导入，空值与PostgREST插入时一样写入空字符串
+        没有key时先TRUNCATE再导入；给出key时先导入临时表，再upsert到目标表并删除已不存在的行
+        """
+        stream = CSVRowStream(columns, records)
+        copy_table = table_name if key is None else f"{table_name}_staging"
+        column_list = sql.SQL(', ').join(sql.Identifier(col) for col in columns)
+        copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({}))").format(
+            sql.Identifier(copy_table), column_list, column_list)
+        
+        if key is None:
+            cur.execute(sql.SQL("TRUNCATE TABLE {} RESTART IDENTITY").format(sql.Identifier(table_name)))
+            cur.copy_expert(copy_sql, stream)
+        else:
+            cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+                sql.Identifier(copy_table), sql.Identifier(table_name)))
+            cur.copy_expert(copy_sql, stream)
+            upsert_sql, delete_sql = self.merge_sql(table_name, copy_table, columns, key)
+            cur.execute(upsert_sql)
+            changed_count = cur.rowcount
+            cur.execute(delete_sql)
+            self.logger.info(f"表 {table_name} 新增或更新 {changed_count} 条，删除 {cur.rowcount} 条")
+        return stream.count
+    
+    @staticmethod
+    def encode_bulk_insert(table_name, batch_data, key=None):
+        """
+        把一批数据编码为bulk_insert函数的请求体：按列发送，字段名不必每行重复，服务端用unnest一次插入
+        """
+        columns = list(batch_data[0])
+        params = {'tbl': table_name, 'data': {col: [record[col] for record in batch_data] for col in columns}}
+        if key is not None:
+            params['key'] = key
+        return encode_json(params)
+    
+    @staticmethod
+    def is_function_missing(error):
+        """
+        判断RPC调用失败是否因为数据库函数不存在（PostgREST错误码PGRST202）
+        """
+        return getattr(error, 'code', None) == 'PGRST202' or 'PGRST202' in str(error)
+    
+    @staticmethod
+    def is_payload_too_large(error):
+        """
+        判断插入失败是否因为请求体过大（HTTP 413）：检查HTTP状态码（call_rpc抛出的APIError带有status_code）
+        或postgrest-py给出的错误码，不在错误信息中查找，记录中的值碰巧含有"413"时不会被误判
+        """
+        status = getattr(error, 'status_code', None)
+        if status is None:
+            status = getattr(error, 'code', None)
+        return str(status) == '413'
+    
+    def split_batches(self, records, batch_size, table_name, key=None):
+        """
+        从记录迭代器中逐批取出数据，每批不超过batch_size条，返回 (这一批数据, 已编码的请求体)
+        每批只编码一次，请求体直接交给send_batch发送；超过MAX_PAYLOAD_BYTES时按超出的比例截短后重新编码（至少保留一条记录）
+        已确认bulk_insert函数不存在时请求体为None，由按行插入的客户端自行编码，过大时由insert_batch拆分
+        """
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, batch_size))
+            if not chunk:
+                return
+            while chunk:
+                if self.bulk_insert_rpc_available is False:
+                    batch_data, body = chunk, None
+                else:
+                    batch_data = chunk
+                    body = self.encode_bulk_insert(table_name, batch_data, key)
+                    while len(body) > MAX_PAYLOAD_BYTES and len(batch_data) > 1:
+                        # 按请求体超出的比例截短（留5%余量），通常重新编码一次即可
+                        keep = int(len(batch_data) * MAX_PAYLOAD_BYTES / len(body) * 0.95)
+                        batch_data = batch_data[:max(keep, 1)]
+                        body = self.encode_bulk_insert(table_name, batch_data, key)
+                yield batch_data, body
+                chunk = chunk[len(batch_data):]
+    
+    @staticmethod
+    def is_gzip_rejected(response):
+        """
+        判断请求是否因为服务端不解压请求体而失败：压缩数据被当作无效的JSON（PostgREST错误码PGRST102）或不支持该编码（HTTP 415）
+        """
+        if response.status_code == 415:
+            return True
+        if response.status_code != 400:
+            return False
+        try:
+            return response.json().get('code') == 'PGRST102'
+        except (ValueError, AttributeError):
+            return False
+    
+    @staticmethod
+    def check_response(response):
+        """
+        请求出错时抛出APIError（status_code属性为HTTP状态码），否则返回响应
+        """
+        if not response.is_error:
+            return response
+        try:
+            error = response.json()
+        except ValueError:
+            error = None
+        if not isinstance(error, dict):
+            error = {'message': response.text}
+        error.setdefault('code', str(response.status_code))
+        api_error = APIError(error)
+        api_error.status_code = response.status_code
+        raise api_error
+    
+    def post_rpc(self, name, body, compress=False):
+        """
+        通过PostgREST客户端的会话发送已编码的请求体，compress为True时用gzip压缩
+        """
+        headers = {'Content-Type': 'application/json'}
+        if compress:
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        return self.supabase.postgrest.session.post(f'/rpc/{name}', content=body, headers=headers)
+    
+    def call_rpc(self, name, params=None, body=None):
+        """
+        调用数据库函数，请求出错时抛出APIError
+        参数用encode_json编码后直接发送（安装了orjson时比postgrest-py内部的标准库json快得多），已编码的请求体可通过body传入；
+        请求体超过GZIP_MIN_BYTES时先尝试gzip压缩，服务端不接受时改为不压缩重发，之后不再压缩
+        """
+        if body is None:
+            body = encode_json(params)
+        if self.gzip_available is not False and len(body) > GZIP_MIN_BYTES:
+            response = self.post_rpc(name, body, compress=True)
+            if not self.is_gzip_rejected(response):
+                if not response.is_error:
+                    self.set_flag('gzip_available', True)
+                return self.check_response(response)
+            if self.set_flag('gzip_available', False) is None:
+                self.logger.warning("服务端不接受gzip压缩的请求体，改为不压缩发送")
+        return self.check_response(self.post_rpc(name, body))
+    
+    def send_batch(self, table_name, batch_data, key=None, body=None):
+        """
+        发送一批数据，返回是否成功，请求出错时抛出异常
+        bulk_insert函数可用时按列发送（body为split_batches已编码的请求体，None时在这里编码），否则按行插入
+        给出key时按该字段upsert
+        """
+        if self.bulk_insert_rpc_available is not False:
+            if body is None:
+                body = self.encode_bulk_insert(table_name, batch_data, key)
+            try:
+                self.call_rpc(BULK_INSERT_RPC, body=body)
+                self.set_flag('bulk_insert_rpc_available', True)
+                return True
+            except Exception as e:
+                if not self.is_function_missing(e):
+                    raise
+                if self.set_flag('bulk_insert_rpc_available', False) is None:
+                    self.logger.warning(f"未找到 {BULK_INSERT_RPC} 函数，改用按行插入: {str(e)}")
+        
+        table = self.supabase.table(table_name)
+        if key is None:
+            return bool(table.insert(batch_data).execute().data)
+        # 同一批中key重复时只保留最后一条，否则upsert会因同一行被更新两次而报错
+        batch_data = list({record[key]: record for record in batch_data}.values())
+        return bool(table.upsert(batch_data, on_conflict=key).execute().data)
+    
+    def fetch_column_values(self, table_name, column):
+        """
+        分页读取表中某个字段的所有值
+        """
+        values = []
+        start = 0
+        while True:
+            rows = (self.supabase.table(table_name).select(column).order(column)
+                    .range(start, start + KEY_PAGE_SIZE - 1).execute().data)
+            values.extend(row[column] for row in rows)
+            if len(rows) < KEY_PAGE_SIZE:
+                return values
+            start += KEY_PAGE_SIZE
+    
+    def delete_missing_rows(self, table_name, key, keys):
+        """
+        upsert之后删除表中key字段的值不在keys（本次上传的全部key）中的行
+        bulk_insert函数可用时delete_missing函数也已创建（在同一个SQL文件中）；
+        否则先分页读取表中现有的key，再按每批不超过DELETE_BATCH_SIZE个key删除，URL长度不随数据量增长
+        """
+        if self.bulk_insert_rpc_available:
+            self.call_rpc(DELETE_MISSING_RPC, {'tbl': table_name, 'key': key, 'keys': keys})
+        else:
+            kept = set(map(str, keys))
+            missing = [value for value in self.fetch_column_values(table_name, key) if str(value) not in kept]
+            for start in range(0, len(missing), DELETE_BATCH_SIZE):
+                (self.supabase.table(table_name).delete(returning='minimal')
+                 .in_(key, missing[start:start + DELETE_BATCH_SIZE]).execute())
+        self.logger.info(f"表 {table_name} 已删除不在本次数据中的记录")
+    
+    def insert_batch(self, table_name, batch_data, key=None, body=None):
+        """
+        插入一批数据，返回 (成功数, 失败数)
+        请求体过大时把这一批拆成两半分别插入
+        """
+        try:
+            sent = self.send_batch(table_name, batch_data, key, body)
+        except Exception as batch_error:
+            if self.is_payload_too_large(batch_error) and len(batch_data) > 1:
+                half = len(batch_data) // 2
+                self.logger.warning(f"请求体过大，拆分为 {half} 和 {len(batch_data) - half} 条记录后重试")
+                first = self.insert_batch(table_name, batch_data[:half], key)
+                second = self.insert_batch(table_name, batch_data[half:], key)
+                return first[0] + second[0], first[1] + second[1]
+            self.logger.error(f"❌ 插入 {len(batch_data)} 条记录失败: {str(batch_error)}")
+            return 0, len(batch_data)
+        
+        if not sent:
+            self.logger.error(f"❌ 插入 {len(batch_data)} 条记录失败: 无返回数据")
+            return 0, len(batch_data)
+        return len(batch_data), 0
+    
+    def batch_insert_data(self, table_name, records, key=None, batch_size=BATCH_SIZE):
         """
         批量插入数据
+        各批之间相互独立，提交到insert_pool并发发送（各表共用，总共INSERT_WORKERS个线程），通过同一个客户端复用连接；
+        边读取记录边发送，同时在途的批次不超过INSERT_WORKERS的两倍，不必先生成全部记录
+        给出key时按该字段upsert，全部记录读取完后删除表中已不存在的行
         """
+        self.logger.info(f"开始批量插入记录到表 {table_name}")
+        success_count = 0
+        error_count = 0
+        submitted_count = 0
+        
+        # 每批的结果只在DEBUG级别输出，默认不格式化也不写日志，只输出最后的汇总
+        log_debug = self.logger.debug
+        
+        def collect(done):
+            nonlocal success_count, error_count
+            for future in done:
+                batch_num = pending.pop(future)
+                batch_success, batch_error = future.result()
+                success_count += batch_success
+                error_count += batch_error
+                if batch_error == 0:
+                    log_debug("✅ %s 第 %d 批插入成功 (%d 条记录，累计 %d 条)",
+                              table_name, batch_num, batch_success, success_count)
+                else:
+                    self.logger.error(f"❌ {table_name} 第 {batch_num} 批插入失败 ({batch_error} 条记录)")
+        
+        pending = {}
+        keys = []
         try:
-            total_records = len(data)
-            self.logger.info(f"开始批量插入 {total_records} 条记录到表 {table_name}")
-            
-            success_count = 0
-            error_count = 0
-            
-            # 分批插入
-            for i in range(0, total_records, batch_size):
-                batch_data = data[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                total_batches = (total_records + batch_size - 1) // batch_size
-                
-                try:
-                    self.logger.info(f"插入第 {batch_num}/{total_batches} 批数据 ({len(batch_data)} 条记录)")
-                    
-                    result = self.supabase.table(table_name).insert(batch_data).execute()
-                    
-                    if result.data:
-                        success_count += len(batch_data)
-                        self.logger.info(f"✅ 第 {batch_num} 批插入成功")
-                    else:
-                        error_count += len(batch_data)
-                        self.logger.error(f"❌ 第 {batch_num} 批插入失败: 无返回数据")
-                        
-                except Exception as batch_error:
-                    error_count += len(batch_data)
-                    self.logger.error(f"❌ 第 {batch_num} 批插入失败: {str(batch_error)}")
-            
-            self.logger.info(f"批量插入完成: 成功 {success_count} 条，失败 {error_count} 条")
+            with self.insert_pool() as executor:
+                batches = self.split_batches(records, batch_size, table_name, key)
+                for batch_num, (batch_data, body) in enumerate(batches, 1):
+                    pending[executor.submit(self.insert_batch, table_name, batch_data, key, body)] = batch_num
+                    submitted_count += len(batch_data)
+                    if key is not None:
+                        keys.extend(record[key] for record in batch_data)
+                    if len(pending) >= INSERT_WORKERS * 2:
+                        collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                collect(wait(pending).done)
+            
+            # 所有记录都已读取，key列表完整时才能判断哪些行已不存在
+            if key is not None and keys:
+                self.delete_missing_rows(table_name, key, keys)
+            
+            self.logger.info(f"表 {table_name} 批量插入完成: 成功 {success_count} 条，失败 {error_count} 条")
             return success_count, error_count
             
         except Exception as e:
             self.logger.error(f"❌ 批量插入数据失败: {str(e)}")
-            return 0, len(data)
+            # 读取中途出错时后面的记录数未知，至少记为一条失败
+            return success_count, max(submitted_count - success_count, 1)
     
-    def update_hiring_companies(self):
+    def open_table_source(self, table_name, pattern, description, key=None):
         """
-        更新hiring_companies表
+        查找并打开一个表的最新数据文件，返回 (字段列表, 记录迭代器, upsert使用的字段)，找不到文件时返回None
         """
-        try:
-            self.logger.info("=" * 50)
-            self.logger.info("开始更新 hiring_companies 表")
-            
-            # 查找最新的公司数据文件
-            latest_file = self.find_latest_file("all_hiring_companies_*.csv")
-            if not latest_file:
-                self.logger.error("未找到公司数据文件")
-                return False
-            
-            # 读取CSV文件
-            self.logger.info(f"正在读取文件: {latest_file}")
-            df = pd.read_csv(latest_file)
-            
-            # 数据预处理
-            df = df.fillna('')  # 填充空值
-            
-            # 转换为字典列表
-            data = df.to_dict('records')
-            self.logger.info(f"读取到 {len(data)} 条公司记录")
-            
-            # 清空现有数据
-            if not self.clear_table('hiring_companies'):
-                return False
-            
-            # 批量插入新数据
-            success_count, error_count = self.batch_insert_data('hiring_companies', data)
-            
-            if error_count == 0:
-                self.logger.info(f"✅ hiring_companies 表更新成功，共 {success_count} 条记录")
-                return True
-            else:
-                self.logger.warning(f"⚠️ hiring_companies 表更新部分成功: {success_count} 成功，{error_count} 失败")
-                return success_count > 0
-                
-        except Exception as e:
-            self.logger.error(f"❌ 更新 hiring_companies 表失败: {str(e)}")
-            return False
+        self.logger.info("=" * 50)
+        self.logger.info(f"开始更新 {table_name} 表")
+        
+        # 查找最新的数据文件
+        latest_file = self.find_latest_file(pattern)
+        if not latest_file:
+            self.logger.error(f"未找到{description}文件")
+            return None
+        
+        # 读取CSV文件
+        self.logger.info(f"正在读取文件: {latest_file}")
+        columns, records = self.read_csv_records(latest_file)
+        if key is not None and key not in columns:
+            self.logger.warning(f"{latest_file} 中没有 {key} 字段，改为清空表后重新插入")
+            key = None
+        return columns, records, key
     
-    def update_yc_jobs(self):
+    def update_tables_in_transaction(self):
         """
-        更新yc_jobs表
+        有Postgres直连时在一个事务中用COPY更新所有表，只提交一次；
+        任何一个表出错时回滚全部更改，不会出现只更新了一部分表的状态。返回 {表名: 是否成功}
         """
+        results = {table[0]: False for table in TABLES}
+        sources = {}
+        for table in TABLES:
+            try:
+                source = self.open_table_source(*table)
+            except Exception as e:
+                self.logger.error(f"❌ 读取 {table[0]} 表的数据文件失败: {str(e)}")
+                continue
+            if source is not None:
+                sources[table[0]] = source
+        
+        counts = {}
+        current_table = None
         try:
-            self.logger.info("=" * 50)
-            self.logger.info("开始更新 yc_jobs 表")
-            
-            # 查找最新的职位数据文件
-            latest_file = self.find_latest_file("all_jobs_*.csv")
-            if not latest_file:
-                self.logger.error("未找到职位数据文件")
-                return False
-            
-            # 读取CSV文件
-            self.logger.info(f"正在读取文件: {latest_file}")
-            df = pd.read_csv(latest_file)
-            
-            # 数据预处理
-            df = df.fillna('')  # 填充空值
-            
-            # 转换为字典列表
-            data = df.to_dict('records')
-            self.logger.info(f"读取到 {len(data)} 条职位记录")
-            
-            # 清空现有数据
-            if not self.clear_table('yc_jobs'):
-                return False
-            
-            # 批量插入新数据
-            success_count, error_count = self.batch_insert_data('yc_jobs', data)
-            
-            if error_count == 0:
-                self.logger.info(f"✅ yc_jobs 表更新成功，共 {success_count} 条记录")
-                return True
-            else:
-                self.logger.warning(f"⚠️ yc_jobs 表更新部分成功: {success_count} 成功，{error_count} 失败")
-                return success_count > 0
-                
+            with self.db_connection() as conn, conn.cursor() as cur:
+                for current_table, (columns, records, key) in sources.items():
+                    self.logger.info(f"开始通过COPY导入记录到表 {current_table}")
+                    counts[current_table] = self.copy_table(cur, current_table, columns, records, key)
         except Exception as e:
-            self.logger.error(f"❌ 更新 yc_jobs 表失败: {str(e)}")
-            return False
+            failed = f"表 {current_table} " if current_table else ""
+            self.logger.error(f"❌ {failed}COPY导入数据失败，已回滚本次所有表的更新: {str(e)}")
+            return results
+        
+        for table_name, count in counts.items():
+            self.logger.info(f"✅ {table_name} 表更新成功，共 {count} 条记录")
+            results[table_name] = True
+        return results
     
-    def update_yc_jobs_join(self):
+    def update_table(self, table_name, pattern, description, key=None):
         """
-        更新yc_jobs_join表（合并后的数据）
+        通过PostgREST用最新的数据文件更新一个表
+        给出key时按该字段upsert，否则清空表后重新插入
         """
         try:
-            self.logger.info("=" * 50)
-            self.logger.info("开始更新 yc_jobs_join 表")
-            
-            # 查找最新的合并数据文件
-            latest_file = self.find_latest_file("all_jobs_company_info_*.csv")
-            if not latest_file:
-                self.logger.error("未找到合并数据文件")
+            source = self.open_table_source(table_name, pattern, description, key)
+            if source is None:
                 return False
+            columns, records, key = source
             
-            # 读取CSV文件
-            self.logger.info(f"正在读取文件: {latest_file}")
-            df = pd.read_csv(latest_file)
-            
-            # 数据预处理
-            df = df.fillna('')  # 填充空值
-            
-            # 转换为字典列表
-            data = df.to_dict('records')
-            self.logger.info(f"读取到 {len(data)} 条合并记录")
-            
-            # 清空现有数据
-            if not self.clear_table('yc_jobs_join'):
+            # 清空现有数据（按key upsert时不清空）
+            if key is None and not self.clear_table(table_name):
                 return False
             
             # 批量插入新数据
-            success_count, error_count = self.batch_insert_data('yc_jobs_join', data)
+            success_count, error_count = self.batch_insert_data(table_name, records, key)
             
             if error_count == 0:
-                self.logger.info(f"✅ yc_jobs_join 表更新成功，共 {success_count} 条记录")
+                self.logger.info(f"✅ {table_name} 表更新成功，共 {success_count} 条记录")
                 return True
             else:
-                self.logger.warning(f"⚠️ yc_jobs_join 表更新部分成功: {success_count} 成功，{error_count} 失败")
+                self.logger.warning(f"⚠️ {table_name} 表更新部分成功: {success_count} 成功，{error_count} 失败")
                 return success_count > 0
                 
         except Exception as e:
-            self.logger.error(f"❌ 更新 yc_jobs_join 表失败: {str(e)}")
+            self.logger.error(f"❌ 更新 {table_name} 表失败: {str(e)}")
             return False
     
     def run_update(self):
@@ -309,12 +831,18 @@ class SupabaseUpdater:
             if not self.connect_to_database():
                 return False
             
-            # 更新各个表
-            results = {
-                'hiring_companies': self.update_hiring_companies(),
-                'yc_jobs': self.update_yc_jobs(),
-                'yc_jobs_join': self.update_yc_jobs_join()
-            }
+            # 先扫描一次数据文件，各表共用扫描结果
+            self.list_candidate_files()
+            
+            if self.db_conn is not None:
+                results = self.update_tables_in_transaction()
+            else:
+                # 通过PostgREST更新时各表相互独立，并发更新，网络等待时间相互重叠；
+                # 各表的插入请求都提交到同一个线程池，同时发送的插入请求总数不超过INSERT_WORKERS
+                with ThreadPoolExecutor(max_workers=INSERT_WORKERS) as self.insert_executor, \
+                        ThreadPoolExecutor(max_workers=len(TABLES)) as executor:
+                    updates = executor.map(lambda table: self.update_table(*table), TABLES)
+                    results = dict(zip([table[0] for table in TABLES], updates))
             
             # 汇总结果
             self.logger.info("=" * 50)
@@ -340,6 +868,9 @@ class SupabaseUpdater:
         except Exception as e:
             self.logger.error(f"❌ 更新流程执行失败: {str(e)}")
             return False
+        finally:
+            self.insert_executor = None
+            self.close_postgres()
 
 def main():
     """